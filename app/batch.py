@@ -0,0 +1,251 @@
+"""
+Command-line batch translation of a directory or ZIP of images and PDFs.
+
+    python -m app.batch filings/ --targets en,ja --out translated/
+    python -m app.batch filings.zip --targets en --source zh-TW
+
+Files are translated BATCH_WORKERS at a time with the same pipelines as the
+web app; every worker shares the translator's global cap on Ollama requests
+(OLLAMA_MAX_PARALLEL, or the per-backend limits of OLLAMA_BACKENDS). Each file gets one output per target
+language, mirroring the input layout under --out. Outputs that a previous
+run already finished are skipped, and interrupted PDFs resume from their
+page checkpoints. A manifest with per-file status, timings and errors is
+written to the output folder.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import zipfile
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    LANGUAGES, ALLOWED_IMAGE_EXTENSIONS, ALLOWED_PDF_EXTENSIONS,
+    BATCH_WORKERS, BATCH_MANIFEST_NAME, OLLAMA_MAX_PARALLEL, OLLAMA_BACKENDS,
+)
+from app.modules.image_handler import translate_image_multi
+from app.modules.pdf_handler import translate_pdf_multi
+from app.modules.translator import TranslationIncomplete
+from app.modules.workers import shutdown as shutdown_workers
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_MARKER = ".partial"
+
+
+def _file_mode(name: str) -> str | None:
+    ext = name.rsplit(".", 1)[1].lower() if "." in name else ""
+    if ext in ALLOWED_IMAGE_EXTENSIONS:
+        return "image"
+    if ext in ALLOWED_PDF_EXTENSIONS:
+        return "pdf"
+    return None
+
+
+def _output_ext(mode: str, name: str) -> str:
+    if mode == "image":
+        return "png" if name.lower().endswith(".png") else "jpg"
+    return "pdf"
+
+
+def _safe_name(name: str) -> bool:
+    """Skip hidden files and archive members that would land outside the output folder."""
+    path = os.path.normpath(name)
+    return not (os.path.isabs(path) or path.startswith("..") or os.path.basename(path).startswith("."))
+
+
+class _Source:
+    """Input files from a directory tree or a ZIP archive, read on demand."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path) if zipfile.is_zipfile(path) else None
+
+    def names(self) -> list[str]:
+        """Relative paths of the translatable files, sorted."""
+        if self._zip is not None:
+            names = [i.filename for i in self._zip.infolist() if not i.is_dir()]
+        else:
+            names = []
+            for root, _, files in os.walk(self.path):
+                for f in files:
+                    names.append(os.path.relpath(os.path.join(root, f), self.path).replace(os.sep, "/"))
+        return sorted(n for n in names if _file_mode(n) and _safe_name(n))
+
+    def read(self, name: str) -> bytes:
+        if self._zip is not None:
+            return self._zip.read(name)
+        with open(os.path.join(self.path, name), "rb") as f:
+            return f.read()
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+
+
+def _load_manifest(path: str) -> dict[str, dict]:
+    """Per-file entries of a previous run's manifest, keyed by input name."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return {entry["file"]: entry for entry in json.load(f).get("files", [])}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp = f"{path}{PARTIAL_MARKER}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def translate_file(source: _Source, name: str, source_lang: str, targets: list[str],
+                   out_dir: str, previous: dict | None = None, force: bool = False) -> dict:
+    """
+    Translate one input file into every target. Returns its manifest entry:
+    status is "done", "skipped" (outputs from an earlier run are current) or
+    "failed". A file is failed if any page or region kept its original text;
+    only the targets that came out whole are published.
+    """
+    started = time.perf_counter()
+    mode = _file_mode(name)
+    ext = _output_ext(mode, name)
+    # Keep the source extension so a.jpg, a.jpeg and a.webp get distinct outputs
+    outputs = {target: os.path.join(out_dir, f"{name}_{target}.{ext}") for target in targets}
+    entry = {"file": name, "mode": mode, "outputs": {t: os.path.relpath(p, out_dir) for t, p in outputs.items()}}
+
+    partials = None
+    try:
+        data = source.read(name)
+        content_hash = hashlib.sha256(data).hexdigest()
+        entry["bytes"] = len(data)
+        entry["content_hash"] = content_hash
+
+        # Only languages without a current output are translated
+        same_input = not previous or previous.get("content_hash") == content_hash
+        if not force and same_input:
+            outputs = {t: p for t, p in outputs.items() if not os.path.exists(p)}
+        if not outputs:
+            entry["status"] = "skipped"
+            return entry
+
+        os.makedirs(os.path.dirname(next(iter(outputs.values()))), exist_ok=True)
+        partials = {t: f"{p.rsplit('.', 1)[0]}{PARTIAL_MARKER}.{ext}" for t, p in outputs.items()}
+        failed = {}
+        try:
+            if mode == "image":
+                translate_image_multi(data, source_lang, partials, strict=True)
+            else:
+                translate_pdf_multi(data, source_lang, partials, content_hash=content_hash, strict=True)
+        except TranslationIncomplete as e:
+            failed = e.failed
+        # Publish atomically so an existing output always means a finished one;
+        # incomplete outputs are dropped below, so the next run retries them
+        for target, partial in partials.items():
+            if target not in failed:
+                os.replace(partial, outputs[target])
+        entry["translated"] = [t for t in outputs if t not in failed]
+        if failed:
+            raise TranslationIncomplete(failed)
+        entry["status"] = "done"
+    except Exception as e:
+        logger.error("Failed to translate %s: %s", name, e)
+        entry["status"] = "failed"
+        entry["error"] = str(e)
+        for partial in (partials or {}).values():
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+    finally:
+        entry["seconds"] = round(time.perf_counter() - started, 3)
+    return entry
+
+
+def run_batch(input_path: str, targets: list[str], out_dir: str, source_lang: str = "auto",
+              workers: int = BATCH_WORKERS, force: bool = False, manifest_path: str | None = None) -> dict:
+    """Translate every image and PDF under input_path and write the manifest. Returns it."""
+    manifest_path = manifest_path or os.path.join(out_dir, BATCH_MANIFEST_NAME)
+    os.makedirs(out_dir, exist_ok=True)
+    previous = _load_manifest(manifest_path)
+    source = _Source(input_path)
+    names = source.names()
+    logger.info("Translating %d files into %s with %d workers (Ollama concurrency %d)",
+                len(names), ", ".join(targets), workers,
+                sum(b.get("max_concurrency", OLLAMA_MAX_PARALLEL) for b in OLLAMA_BACKENDS) or OLLAMA_MAX_PARALLEL)
+
+    manifest = {
+        "input": os.path.abspath(input_path),
+        "source_lang": source_lang,
+        "targets": targets,
+        "workers": workers,
+        "started": time.time(),
+        "files": [],
+    }
+    started = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="batch")
+    try:
+        futures = {
+            pool.submit(translate_file, source, name, source_lang, targets, out_dir,
+                        previous.get(name), force): name
+            for name in names
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            entry = future.result()
+            manifest["files"].append(entry)
+            logger.info("[%d/%d] %s: %s (%.1fs)", i, len(names), entry["file"], entry["status"], entry["seconds"])
+    finally:
+        # Runs on Ctrl-C too, so the manifest covers whatever finished
+        pool.shutdown(wait=True, cancel_futures=True)
+        source.close()
+        manifest["files"].sort(key=lambda e: e["file"])
+        manifest["finished"] = time.time()
+        manifest["seconds"] = round(time.perf_counter() - started, 3)
+        manifest["totals"] = {
+            status: sum(1 for e in manifest["files"] if e["status"] == status)
+            for status in ("done", "skipped", "failed")
+        }
+        _write_json(manifest_path, manifest)
+    return manifest
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Translate a directory or ZIP of images and PDFs.")
+    parser.add_argument("input", help="directory or .zip of images and PDFs")
+    parser.add_argument("--targets", required=True, help="comma-separated target languages, e.g. en,ja")
+    parser.add_argument("--source", default="auto", help="source language (default: auto)")
+    parser.add_argument("--out", default="batch_output", help="output folder (default: batch_output)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="files translated at once")
+    parser.add_argument("--manifest", help=f"manifest path (default: <out>/{BATCH_MANIFEST_NAME})")
+    parser.add_argument("--force", action="store_true", help="re-translate files that already have outputs")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = [t for t in targets if t not in LANGUAGES or t == "auto"]
+    if args.source not in LANGUAGES:
+        unknown.append(args.source)
+    if not targets or unknown:
+        parser.error(f"Unsupported language(s): {', '.join(unknown) or 'none given'}")
+    if not os.path.exists(args.input):
+        parser.error(f"No such file or directory: {args.input}")
+
+    try:
+        manifest = run_batch(args.input, targets, args.out, args.source, args.workers, args.force, args.manifest)
+    finally:
+        shutdown_workers()
+    totals = manifest["totals"]
+    print(f"{totals['done']} translated, {totals['skipped']} skipped, {totals['failed']} failed "
+          f"in {manifest['seconds']:.1f}s")
+    return 1 if totals["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,9 +2,13 @@
 
 import os
 import sys
+import json
 import uuid
+import hashlib
+import zipfile
+import threading
 import logging
-from flask import Flask, request, jsonify, send_file, render_template
+from flask import Flask, Response, request, jsonify, send_file, render_template, stream_with_context
 
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -12,10 +16,20 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import (
     LANGUAGES, UPLOAD_FOLDER, OUTPUT_FOLDER,
     MAX_CONTENT_LENGTH, ALLOWED_IMAGE_EXTENSIONS, ALLOWED_PDF_EXTENSIONS,
+    JOB_DB_PATH, JOB_WORKERS, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_MAX_AGE_SECONDS,
 )
-from app.modules.translator import translate_text, check_ollama_status
-from app.modules.image_handler import translate_image
-from app.modules.pdf_handler import translate_pdf
+from app.modules.translator import (
+    translate_text, translate_text_stream, check_ollama_status, cache_stats, document_key,
+    TranslationIncomplete,
+)
+from app.modules.image_handler import translate_image_multi
+from app.modules.pdf_handler import translate_pdf_multi
+from app.modules.scheduler import map_ordered
+from app.modules.jobs import JobManager
+from app.modules.result_cache import ResultCache
+from app.modules.ocr import reader_stats
+from app.modules.workers import warm_up as warm_up_ocr
+from app.modules import metrics
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
@@ -36,6 +50,31 @@ def _allowed_file(filename: str, allowed: set) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in allowed
 
 
+def _wants_timings() -> bool:
+    """Whether the caller asked for a per-request timing breakdown (?timings=1)."""
+    return request.args.get("timings", "").lower() in ("1", "true", "yes")
+
+
+def _parse_targets(value) -> list[str]:
+    """
+    Target languages from a comma-separated string or a list of them (as sent
+    by repeated form fields), deduplicated in order.
+    """
+    if isinstance(value, str):
+        value = [value]
+    targets = []
+    for item in value or []:
+        for lang in str(item).split(","):
+            lang = lang.strip()
+            if lang and lang not in targets:
+                targets.append(lang)
+    return targets
+
+
+def _invalid_targets(targets: list[str]) -> list[str]:
+    return [lang for lang in targets if lang not in LANGUAGES or lang == "auto"]
+
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -47,6 +86,24 @@ def api_ollama_status():
     return jsonify(check_ollama_status())
 
 
+@app.route("/api/cache-stats", methods=["GET"])
+def api_cache_stats():
+    """Translation memory and file result cache counters."""
+    return jsonify({**cache_stats(), "results": results.stats()})
+
+
+@app.route("/metrics", methods=["GET"])
+def api_metrics():
+    """Stage timings, LLM usage, queue depths and cache hit rates for Prometheus."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/ocr-status", methods=["GET"])
+def api_ocr_status():
+    """Resident OCR readers with load times and memory."""
+    return jsonify(reader_stats())
+
+
 @app.route("/api/languages", methods=["GET"])
 def get_languages():
     """Return the supported language list."""
@@ -59,7 +116,7 @@ def get_languages():
 
 @app.route("/api/translate/text", methods=["POST"])
 def api_translate_text():
-    """Translate plain text."""
+    """Translate plain text. With ?timings=1 the response includes a timing breakdown."""
     data = request.get_json()
     if not data:
         return jsonify({"error": "No JSON body provided"}), 400
@@ -67,32 +124,194 @@ def api_translate_text():
     text = data.get("text", "")
     source = data.get("source_lang", "auto")
     target = data.get("target_lang", "")
+    targets = _parse_targets(data.get("target_langs"))
 
     if not text.strip():
         return jsonify({"error": "No text provided"}), 400
-    if not target or target == "auto":
+    invalid = _invalid_targets(targets)
+    if invalid:
+        return jsonify({"error": f"Invalid target language: {', '.join(invalid)}"}), 400
+    if not targets and (not target or target == "auto"):
         return jsonify({"error": "Please select a target language"}), 400
 
     try:
-        result = translate_text(text, source, target)
-        return jsonify({"translated_text": result, "source_lang": source, "target_lang": target})
+        with metrics.collect() as breakdown, metrics.timer("request.translate_text"):
+            if targets:
+                # Multi-target: translate into every language concurrently
+                translated = map_ordered(lambda lang: translate_text(text, source, lang), targets)
+                body = {"translations": dict(zip(targets, translated)), "source_lang": source}
+            else:
+                result = translate_text(text, source, target)
+                body = {"translated_text": result, "source_lang": source, "target_lang": target}
+        if _wants_timings():
+            body["timings"] = breakdown.as_dict()
+        return jsonify(body)
     except Exception as e:
         logger.error("Text translation error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/translate/text/stream", methods=["POST"])
+def api_translate_text_stream():
+    """Translate plain text, streaming the result as Server-Sent Events."""
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No JSON body provided"}), 400
+
+    text = data.get("text", "")
+    source = data.get("source_lang", "auto")
+    target = data.get("target_lang", "")
+
+    if not text.strip():
+        return jsonify({"error": "No text provided"}), 400
+    if not target or target == "auto":
+        return jsonify({"error": "Please select a target language"}), 400
+
+    def events():
+        try:
+            for piece in translate_text_stream(text, source, target):
+                yield f"data: {json.dumps({'text': piece}, ensure_ascii=False)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            logger.error("Streaming text translation error: %s", e)
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+results = ResultCache(OUTPUT_FOLDER, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_MAX_AGE_SECONDS)
+
+
+def _output_ext(mode: str, ext: str) -> str:
+    if mode == "image":
+        return "png" if ext == "png" else "jpg"
+    return "pdf"
+
+
+def _result_key(content_hash: str, source: str, targets: list[str]) -> str:
+    """Result cache key for one target, or for the bundle of several (order-independent)."""
+    return results.make_key(document_key(content_hash, source, "+".join(sorted(targets))))
+
+
+def _bundle_ext(mode: str, ext: str, targets: list[str]) -> str:
+    return _output_ext(mode, ext) if len(targets) == 1 else "zip"
+
+
+def _run_translation_job(job: dict, progress) -> str:
+    """
+    Job handler: translate the queued upload into the result cache and return
+    the output filename. A job with several target languages (comma-separated
+    target_lang) extracts and OCRs once, renders one output per language and
+    returns a zip bundle of them. Only fully translated outputs are cached: if
+    any page or region kept its original text the job fails, so a re-upload
+    retries it, and the job's partial files are removed.
+    """
+    input_path = job["input_path"]
+    ext = input_path.rsplit(".", 1)[1].lower()
+    out_ext = _output_ext(job["mode"], ext)
+    source = job["source_lang"]
+    targets = _parse_targets(job["target_lang"])
+
+    # Read the upload once; the pipelines work from these bytes, not the path
+    with open(input_path, "rb") as f:
+        data = f.read()
+    content_hash = job["content_hash"] or hashlib.sha256(data).hexdigest()
+
+    # Another job may have produced the same output since this one was queued
+    key = _result_key(content_hash, source, targets)
+    cached = results.lookup(key, _bundle_ext(job["mode"], ext, targets))
+    if cached:
+        return cached
+
+    # Per-language outputs are cached on their own, so only missing languages run
+    keys = {target: _result_key(content_hash, source, [target]) for target in targets}
+    filenames = {target: results.lookup(keys[target], out_ext) for target in targets}
+    outputs = {
+        target: results.partial_path(keys[target], out_ext, job["id"])
+        for target, filename in filenames.items() if not filename
+    }
+    partials = [(keys[target], out_ext) for target in outputs]
+    try:
+        if outputs:
+            try:
+                if job["mode"] == "image":
+                    translate_image_multi(data, source, outputs, progress=progress, strict=True)
+                else:
+                    translate_pdf_multi(data, source, outputs, progress=progress,
+                                        content_hash=content_hash, strict=True)
+            except TranslationIncomplete as e:
+                # Cache the languages that came out whole; the rest can be retried
+                for target in outputs:
+                    if target not in e.failed:
+                        results.commit(keys[target], out_ext, job["id"])
+                raise
+            for target in outputs:
+                filenames[target] = results.commit(keys[target], out_ext, job["id"])
+        if len(targets) == 1:
+            return filenames[targets[0]]
+
+        base = (job["filename"] or "file").rsplit(".", 1)[0]
+        partials.append((key, "zip"))
+        with zipfile.ZipFile(results.partial_path(key, "zip", job["id"]), "w") as bundle:
+            for target in targets:
+                # Images and PDFs are already compressed
+                bundle.write(os.path.join(OUTPUT_FOLDER, filenames[target]), f"{base}_{target}.{out_ext}")
+        return results.commit(key, "zip", job["id"])
+    except BaseException:
+        # Failed, incomplete or cancelled: leave nothing half-written behind
+        for partial_key, partial_ext in partials:
+            results.discard(partial_key, partial_ext, job["id"])
+        raise
+
+
+jobs = JobManager(JOB_DB_PATH, _run_translation_job, workers=JOB_WORKERS)
+
+metrics.gauge("jobs_queued", jobs.queue_depth, help="Translation jobs waiting for a worker")
+metrics.gauge("translation_cache_hit_rate", lambda: cache_stats()["hit_rate"],
+              help="Share of segment lookups served from the translation cache")
+metrics.gauge("result_cache_events", results.stats, help="File result cache hits, misses, stores and evictions",
+              label="event")
+metrics.gauge("ocr_readers_loaded", lambda: len(reader_stats()["readers"]), help="Resident EasyOCR readers")
+
+
+def _job_response(job: dict) -> dict:
+    data = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "mode": job["mode"],
+        "filename": job["filename"],
+        "progress": {"done": job["progress_done"], "total": job["progress_total"]},
+        "status_url": f"/api/jobs/{job['id']}",
+    }
+    if job["status"] == "done":
+        data["download_url"] = f"/api/jobs/{job['id']}/result"
+    if job["error"]:
+        data["error"] = job["error"]
+    if job.get("timings") and _wants_timings():
+        data["timings"] = json.loads(job["timings"])
+    return data
+
+
 @app.route("/api/translate/file", methods=["POST"])
 def api_translate_file():
-    """Translate an uploaded image or PDF."""
+    """Queue an uploaded image or PDF for translation; returns a job id immediately."""
     if "file" not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
 
     file = request.files["file"]
     source = request.form.get("source_lang", "auto")
-    target = request.form.get("target_lang", "")
+    # One target_lang, or several via target_langs (repeated or comma-separated)
+    targets = _parse_targets(request.form.getlist("target_langs") or request.form.get("target_lang", ""))
 
-    if not target or target == "auto":
+    if not targets:
         return jsonify({"error": "Please select a target language"}), 400
+    invalid = _invalid_targets(targets)
+    if invalid:
+        return jsonify({"error": f"Invalid target language: {', '.join(invalid)}"}), 400
     if not file.filename:
         return jsonify({"error": "Empty filename"}), 400
 
@@ -106,62 +325,92 @@ def api_translate_file():
     else:
         return jsonify({"error": f"Unsupported file type: .{ext}"}), 400
 
-    # Save upload
-    input_filename = f"{uid}_input.{ext}"
-    input_path = os.path.join(UPLOAD_FOLDER, input_filename)
-    file.save(input_path)
-
-    try:
-        if mode == "image":
-            out_ext = "png" if ext == "png" else "jpg"
-            output_filename = f"{uid}_translated.{out_ext}"
-            output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-            translate_image(input_path, source, target, output_path)
-        else:
-            output_filename = f"{uid}_translated.pdf"
-            output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-            translate_pdf(input_path, source, target, output_path)
-
+    # Read the upload into memory while hashing it (bounded by MAX_CONTENT_LENGTH)
+    hasher = hashlib.sha256()
+    buf = bytearray()
+    for block in iter(lambda: file.stream.read(1 << 20), b""):
+        hasher.update(block)
+        buf += block
+    content_hash = hasher.hexdigest()
+
+    # Same bytes, languages and model as an earlier upload: serve that output
+    cached = results.lookup(_result_key(content_hash, source, targets), _bundle_ext(mode, ext, targets))
+    if cached:
         return jsonify({
-            "download_url": f"/api/download/{output_filename}",
-            "filename": output_filename,
+            "status": "done",
+            "cached": True,
             "mode": mode,
+            "filename": file.filename,
+            "download_url": f"/api/download/{cached}",
         })
-    except Exception as e:
-        logger.error("File translation error: %s", e)
-        return jsonify({"error": str(e)}), 500
-    finally:
-        # Clean up input
-        try:
-            os.remove(input_path)
-        except OSError:
-            pass
+
+    # The same upload may already be queued or running: share that job
+    for job in jobs.find_active(mode, source, content_hash):
+        if sorted(_parse_targets(job["target_lang"])) == sorted(targets):
+            return jsonify(_job_response(job)), 202
+
+    # Only queued work touches the disk; the job removes the file once finished
+    input_filename = f"{uid}_input.{ext}"
+    input_path = os.path.join(UPLOAD_FOLDER, input_filename)
+    with open(input_path, "wb") as f:
+        f.write(buf)
+
+    job_id = jobs.submit(
+        mode, source, ",".join(targets), input_path, filename=file.filename, content_hash=content_hash,
+    )
+    return jsonify(_job_response(jobs.get(job_id))), 202
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def api_job_status(job_id):
+    """Job status and per-page (or per-region) progress."""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(_job_response(job))
+
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def api_job_cancel(job_id):
+    """Cancel a queued or running job."""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if not jobs.cancel(job_id):
+        return jsonify({"error": f"Job already {job['status']}"}), 409
+    return jsonify(_job_response(jobs.get(job_id)))
+
+
+@app.route("/api/jobs/<job_id>/result", methods=["GET"])
+def api_job_result(job_id):
+    """Download the output of a finished job."""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] != "done":
+        return jsonify({"error": f"Job is {job['status']}"}), 409
+    # send_file resolves relative paths against app.root_path, not the working directory
+    path = os.path.join(os.path.abspath(OUTPUT_FOLDER), job["output_filename"])
+    if not os.path.exists(path):
+        return jsonify({"error": "File not found"}), 404
+    base = (job["filename"] or "file").rsplit(".", 1)[0]
+    out_ext = job["output_filename"].rsplit(".", 1)[1]
+    return send_file(path, as_attachment=True, download_name=f"{base}_translated.{out_ext}")
 
 
 @app.route("/api/download/<filename>")
 def download_file(filename):
     """Download a translated file."""
-    path = os.path.join(OUTPUT_FOLDER, filename)
+    path = os.path.join(os.path.abspath(OUTPUT_FOLDER), filename)
     if not os.path.exists(path):
         return jsonify({"error": "File not found"}), 404
     return send_file(path, as_attachment=True, download_name=filename)
 
 
-def _cleanup_old_outputs(max_age_seconds: int = 3600):
-    """Remove output files older than max_age_seconds on startup."""
-    import time
-    now = time.time()
-    for fname in os.listdir(OUTPUT_FOLDER):
-        fpath = os.path.join(OUTPUT_FOLDER, fname)
-        try:
-            if os.path.isfile(fpath) and now - os.path.getmtime(fpath) > max_age_seconds:
-                os.remove(fpath)
-                logger.info("Cleaned up old output: %s", fname)
-        except OSError:
-            pass
-
-
 if __name__ == "__main__":
-    _cleanup_old_outputs()
+    results.evict()
+    # Warm OCR readers in the background so the first upload skips the model load
+    threading.Thread(target=warm_up_ocr, name="ocr-preload", daemon=True).start()
+    jobs.resume()
     debug = os.environ.get("FLASK_DEBUG", "0") in ("1", "true", "yes")
     app.run(host="0.0.0.0", port=8080, debug=debug)
@@ -0,0 +1,209 @@
+"""Translation memory: in-process LRU in front of an on-disk SQLite store."""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for cache lookups: Unicode form and whitespace collapsed
+    within each line. Line and paragraph breaks are kept, since the
+    translation preserves them.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return "\n".join(" ".join(line.split()) for line in text.splitlines()).strip("\n")
+
+
+def make_key(text: str, source_lang: str, target_lang: str, model: str, prompt_version: str) -> str:
+    """Content-addressed key for a translation request."""
+    raw = "\x1f".join([normalize_text(text), source_lang, target_lang, model, prompt_version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """
+    Two-tier translation cache: LRU dict in memory, SQLite on disk.
+
+    Disk hits do not commit on the read path: a row's last_used is refreshed
+    only when older than touch_interval seconds, and the refreshes are
+    written with the next put, eviction or every touch_batch hits.
+    """
+
+    def __init__(
+        self,
+        db_path: str | None,
+        memory_entries: int = 4096,
+        max_entries: int = 200_000,
+        max_age_seconds: int = 90 * 24 * 3600,
+        evict_every: int = 500,
+        touch_interval: int = 300,
+        touch_batch: int = 1000,
+    ):
+        self.db_path = db_path
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.evict_every = evict_every
+        self.touch_interval = touch_interval
+        self.touch_batch = touch_batch
+
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._writes_since_evict = 0
+        self._touched: dict[str, float] = {}  # key -> last_used not yet written to disk
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        self._conn = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                self._conn = sqlite3.connect(db_path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS translations ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "created REAL NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations(last_used)"
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("Translation cache disabled on disk (%s): %s", db_path, e)
+                self._conn = None
+
+    def get(self, key: str) -> str | None:
+        """Return the cached translation for key, or None."""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return value
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT value, created, last_used FROM translations WHERE key = ?", (key,)
+                    ).fetchone()
+                    now = time.time()
+                    if row and now - row[1] <= self.max_age_seconds:
+                        if now - row[2] > self.touch_interval:
+                            self._touched[key] = now
+                            if len(self._touched) >= self.touch_batch:
+                                self._flush_touched_locked()
+                                self._conn.commit()
+                        self._remember(key, row[0])
+                        self._counters["disk_hits"] += 1
+                        return row[0]
+                except sqlite3.Error as e:
+                    logger.warning("Translation cache read failed: %s", e)
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        """Store a translation in both tiers."""
+        with self._lock:
+            self._remember(key, value)
+            self._counters["writes"] += 1
+            if self._conn is None:
+                return
+            now = time.time()
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO translations (key, value, created, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, value, now, now),
+                )
+                self._touched.pop(key, None)
+                self._flush_touched_locked()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("Translation cache write failed: %s", e)
+                return
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= self.evict_every:
+                self._writes_since_evict = 0
+                self._evict_locked()
+
+    def evict(self) -> int:
+        """Drop expired rows and trim the disk tier to max_entries. Returns rows removed."""
+        with self._lock:
+            return self._evict_locked()
+
+    def clear(self) -> None:
+        """Remove every cached translation."""
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM translations")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and tier sizes."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = 0
+            if self._conn is not None:
+                try:
+                    stats["disk_entries"] = self._conn.execute(
+                        "SELECT COUNT(*) FROM translations"
+                    ).fetchone()[0]
+                except sqlite3.Error:
+                    pass
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, key: str, value: str) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _flush_touched_locked(self) -> None:
+        """Queue pending last_used refreshes in the current transaction; the caller commits."""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE translations SET last_used = ? WHERE key = ?",
+                [(ts, key) for key, ts in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict_locked(self) -> int:
+        if self._conn is None:
+            return 0
+        removed = 0
+        try:
+            # LRU trimming below orders by last_used, so write pending refreshes first
+            self._flush_touched_locked()
+            cur = self._conn.execute(
+                "DELETE FROM translations WHERE created < ?", (time.time() - self.max_age_seconds,)
+            )
+            removed += cur.rowcount
+            count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            if count > self.max_entries:
+                cur = self._conn.execute(
+                    "DELETE FROM translations WHERE key IN ("
+                    "SELECT key FROM translations ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                removed += cur.rowcount
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("Translation cache eviction failed: %s", e)
+        if removed:
+            self._counters["evictions"] += removed
+            logger.info("Evicted %d translation cache entries", removed)
+        return removed
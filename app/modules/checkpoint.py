@@ -0,0 +1,85 @@
+"""Per-page checkpoints so interrupted document translations can resume."""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, read in blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class CheckpointStore:
+    """SQLite store of translated segments per (document key, page)."""
+
+    def __init__(self, db_path: str | None, max_age_seconds: int = 7 * 24 * 3600):
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+        if not db_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS page_checkpoints ("
+                "doc_key TEXT NOT NULL, page_num INTEGER NOT NULL, segments TEXT NOT NULL, "
+                "created REAL NOT NULL, PRIMARY KEY (doc_key, page_num))"
+            )
+            self._conn.execute(
+                "DELETE FROM page_checkpoints WHERE created < ?", (time.time() - max_age_seconds,)
+            )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("Checkpoints disabled (%s): %s", db_path, e)
+            self._conn = None
+
+    def load(self, doc_key: str) -> dict[int, list[str]]:
+        """Return {page_num: translated segments} for every checkpointed page."""
+        if self._conn is None:
+            return {}
+        with self._lock:
+            try:
+                rows = self._conn.execute(
+                    "SELECT page_num, segments FROM page_checkpoints WHERE doc_key = ?", (doc_key,)
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning("Checkpoint read failed: %s", e)
+                return {}
+        return {page_num: json.loads(segments) for page_num, segments in rows}
+
+    def save(self, doc_key: str, page_num: int, segments: list[str]) -> None:
+        if self._conn is None:
+            return
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO page_checkpoints (doc_key, page_num, segments, created) "
+                    "VALUES (?, ?, ?, ?)",
+                    (doc_key, page_num, json.dumps(segments, ensure_ascii=False), time.time()),
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("Checkpoint write failed: %s", e)
+
+    def clear(self, doc_key: str) -> None:
+        if self._conn is None:
+            return
+        with self._lock:
+            try:
+                self._conn.execute("DELETE FROM page_checkpoints WHERE doc_key = ?", (doc_key,))
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("Checkpoint clear failed: %s", e)
@@ -0,0 +1,112 @@
+"""Shared font lookup and parsed-font caches for image and PDF rendering."""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from PIL import ImageFont
+from config import CJK_FONT_PATHS, LATIN_FONT_PATHS
+from app.modules import metrics
+
+logger = logging.getLogger(__name__)
+
+# Parsed fonts are not safe to share between threads (FreeType faces,
+# MuPDF objects), so each worker thread keeps its own small LRU.
+_local = threading.local()
+_MAX_CACHED_FONTS = 128
+
+
+def is_cjk(lang: str) -> bool:
+    return lang in ("zh-TW", "zh-CN", "ja", "ko")
+
+
+@lru_cache(maxsize=None)
+def _find_font(paths: tuple[str, ...]) -> str | None:
+    for p in paths:
+        if os.path.exists(p):
+            return p
+    return None
+
+
+def font_path_for(target_lang: str) -> str | None:
+    """First existing font file for the target script (resolved once per process)."""
+    return _find_font(tuple(CJK_FONT_PATHS if is_cjk(target_lang) else LATIN_FONT_PATHS))
+
+
+def _thread_cache(name: str) -> OrderedDict:
+    cache = getattr(_local, name, None)
+    if cache is None:
+        cache = OrderedDict()
+        setattr(_local, name, cache)
+    return cache
+
+
+def _cached(name: str, key, build):
+    cache = _thread_cache(name)
+    value = cache.get(key)
+    if value is None:
+        with metrics.timer("font.load"):
+            value = build()
+        cache[key] = value
+        if len(cache) > _MAX_CACHED_FONTS:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return value
+
+
+def get_pil_font(font_path: str | None, size: int) -> ImageFont.ImageFont:
+    """PIL font for (path, size), parsed once per thread."""
+    if not font_path:
+        return ImageFont.load_default()
+
+    def build():
+        try:
+            return ImageFont.truetype(font_path, size)
+        except Exception as e:
+            logger.warning("Could not load font %s: %s", font_path, e)
+            return ImageFont.load_default()
+
+    return _cached("pil", (font_path, size), build)
+
+
+def get_fitz_font(font_path: str | None):
+    """PyMuPDF font for a font file (or Helvetica), parsed once per thread."""
+    import fitz  # PyMuPDF
+
+    def build():
+        if font_path:
+            try:
+                return fitz.Font(fontfile=font_path)
+            except Exception as e:
+                logger.warning("Could not load font %s: %s", font_path, e)
+        return fitz.Font("helv")
+
+    return _cached("fitz", font_path, build)
+
+
+def fit_pil_font(draw, text: str, font_path: str | None, max_width: int, max_height: int,
+                 start_size: int = 40, min_size: int = 5):
+    """
+    Largest font size (binary search between min_size and start_size) whose
+    rendered text fits in max_width x max_height. Returns (font, size).
+    """
+    def fits(size: int) -> bool:
+        try:
+            bbox = draw.textbbox((0, 0), text, font=get_pil_font(font_path, size))
+        except Exception:
+            return False
+        return bbox[2] - bbox[0] <= max_width and bbox[3] - bbox[1] <= max_height
+
+    lo, hi, best = min_size, max(start_size, min_size), None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if fits(mid):
+            best = mid
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    if best is None:
+        return ImageFont.load_default(), 10
+    return get_pil_font(font_path, best), best
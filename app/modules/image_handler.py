@@ -1,41 +1,19 @@
 """Image translation: OCR → translate → overlay text back on image."""
 
+import io
 import logging
-import os
-import math
-from PIL import Image, ImageDraw, ImageFont
-from config import CJK_FONT_PATHS, LATIN_FONT_PATHS
-from app.modules.ocr import extract_text_from_image
-from app.modules.translator import translate_text
+from typing import Callable
+import numpy as np
+from PIL import Image, ImageDraw
+from app.modules.fonts import font_path_for, fit_pil_font
+from app.modules.workers import run_ocr, run_compose
+from app.modules.translator import translate_segments, TranslationIncomplete
+from app.modules.scheduler import map_ordered
+from app.modules import metrics
 
 logger = logging.getLogger(__name__)
 
 
-def _find_font(paths: list[str]) -> str | None:
-    for p in paths:
-        if os.path.exists(p):
-            return p
-    return None
-
-
-def _is_cjk(lang: str) -> bool:
-    return lang in ("zh-TW", "zh-CN", "ja", "ko")
-
-
-def _get_font(target_lang: str, size: int) -> ImageFont.FreeTypeFont:
-    if _is_cjk(target_lang):
-        path = _find_font(CJK_FONT_PATHS)
-    else:
-        path = _find_font(LATIN_FONT_PATHS)
-
-    if path:
-        try:
-            return ImageFont.truetype(path, size)
-        except Exception:
-            pass
-    return ImageFont.load_default()
-
-
 def _bbox_to_rect(bbox):
     """Convert 4-point bbox to (x_min, y_min, x_max, y_max)."""
     xs = [p[0] for p in bbox]
@@ -43,105 +21,177 @@ def _bbox_to_rect(bbox):
     return min(xs), min(ys), max(xs), max(ys)
 
 
-def _fit_text_size(draw, text, font_path, max_width, max_height, start_size=40):
-    """Find the largest font size that fits text in the given box."""
-    for size in range(start_size, 4, -1):
-        try:
-            if font_path:
-                font = ImageFont.truetype(font_path, size)
-            else:
-                font = ImageFont.load_default()
-            bbox = draw.textbbox((0, 0), text, font=font)
-            tw = bbox[2] - bbox[0]
-            th = bbox[3] - bbox[1]
-            if tw <= max_width and th <= max_height:
-                return font, size
-        except Exception:
+def _sample_backgrounds(arr: np.ndarray, rects: np.ndarray, samples: int = 8) -> np.ndarray:
+    """
+    Estimate each region's background color from pixels along its border.
+    rects is an (n, 4) int array of inclusive (x_min, y_min, x_max, y_max);
+    returns an (n, 3) uint8 array. All regions are sampled in one gather.
+    """
+    h, w = arr.shape[:2]
+    t = np.linspace(0.0, 1.0, samples)
+    x0, y0, x1, y1 = (rects[:, i:i + 1].astype(np.float64) for i in range(4))
+    along_x = x0 + (x1 - x0) * t  # (n, samples)
+    along_y = y0 + (y1 - y0) * t
+    xs = np.concatenate([along_x, along_x, np.repeat(x0, samples, 1), np.repeat(x1, samples, 1)], axis=1)
+    ys = np.concatenate([np.repeat(y0, samples, 1), np.repeat(y1, samples, 1), along_y, along_y], axis=1)
+    xs = np.clip(np.rint(xs).astype(np.intp), 0, w - 1)
+    ys = np.clip(np.rint(ys).astype(np.intp), 0, h - 1)
+    # Median rather than mean so stray text pixels on the border do not tint the fill
+    return np.median(arr[ys, xs, :3], axis=1).astype(np.uint8)
+
+
+def load_rgb(image) -> np.ndarray:
+    """Decode an image given as a path, raw bytes or array into a writable RGB array."""
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = io.BytesIO(image)
+    with Image.open(image) as img:
+        return np.array(img if img.mode == "RGB" else img.convert("RGB"))
+
+
+def compose_image(
+    image,
+    regions: list[dict],
+    translations: list[str],
+    target_lang: str,
+    output_path: str,
+) -> str:
+    """
+    Paint over each OCR region and draw its translation. image is a path,
+    bytes or an RGB array (modified in place). Returns the output path.
+    """
+    arr = load_rgb(image)
+    if not regions:
+        Image.fromarray(arr).save(output_path, quality=95)
+        return output_path
+
+    h, w = arr.shape[:2]
+    rects = np.array([_bbox_to_rect(r["bbox"]) for r in regions], dtype=np.float64)
+    rects = np.rint(rects).astype(np.intp)
+    rects[:, [0, 2]] = np.clip(rects[:, [0, 2]], 0, w - 1)
+    rects[:, [1, 3]] = np.clip(rects[:, [1, 3]], 0, h - 1)
+
+    bg_colors = _sample_backgrounds(arr, rects)
+    # Pick a text color that contrasts with each background
+    brightness = bg_colors.astype(np.float64) @ np.array([0.299, 0.587, 0.114])
+    dark_text = brightness > 128
+
+    # Fill original regions with their background color, in place
+    for (x_min, y_min, x_max, y_max), color in zip(rects, bg_colors):
+        arr[y_min:y_max + 1, x_min:x_max + 1] = color
+
+    img = Image.fromarray(arr)
+    draw = ImageDraw.Draw(img)
+    font_path = font_path_for(target_lang)
+
+    for (x_min, y_min, x_max, y_max), translated, dark in zip(rects, translations, dark_text):
+        box_w = int(x_max - x_min)
+        box_h = int(y_max - y_min)
+        if box_w <= 0 or box_h <= 0:
             continue
-    return ImageFont.load_default(), 10
+        # Fit text (fonts are parsed once and cached per size)
+        font, _ = fit_pil_font(draw, translated, font_path, box_w, box_h, start_size=box_h)
+        draw.text(
+            (int(x_min) + 1, int(y_min) + 1),
+            translated,
+            fill=(0, 0, 0) if dark else (255, 255, 255),
+            font=font,
+        )
+
+    img.save(output_path, quality=95)
+    return output_path
 
 
 def translate_image(
-    input_path: str,
+    input_file,
     source_lang: str,
     target_lang: str,
     output_path: str,
+    progress: Callable[[int, int], None] | None = None,
 ) -> str:
     """
     OCR an image, translate detected text, overlay translations.
+    input_file is a path or the raw image bytes; it is decoded once and the
+    same array feeds OCR and compositing. OCR and compositing run on the
+    configured OCR backend (in-process or a process pool); translation runs here.
+    progress(regions_done, total_regions) is called before and after translation.
     Returns the output file path.
     """
+    translate_image_multi(input_file, source_lang, {target_lang: output_path}, progress=progress)
+    return output_path
+
+
+def translate_image_multi(
+    input_file,
+    source_lang: str,
+    outputs: dict[str, str],
+    progress: Callable[[int, int], None] | None = None,
+    strict: bool = False,
+) -> dict[str, str]:
+    """
+    Translate an image into several target languages from a single OCR pass.
+    outputs maps each target language to its output path; the regions found
+    once are translated into every target concurrently and composited onto a
+    copy of the decoded image per target. A target whose regions fail to
+    translate keeps the original text; with strict set, TranslationIncomplete
+    is raised once every output has been written. Returns outputs.
+    """
+    targets = list(outputs)
+
     # 1. OCR
-    regions = extract_text_from_image(input_path, source_lang)
+    with metrics.timer("image.decode"):
+        image = load_rgb(input_file)
+    with metrics.timer("image.ocr"):
+        regions = run_ocr(image, source_lang)
+    metrics.inc("images_total", help="Images translated")
     if not regions:
         logger.info("No text detected in image")
         # Just copy the image
-        img = Image.open(input_path)
-        img.save(output_path)
-        return output_path
+        for path in outputs.values():
+            Image.fromarray(image).save(path, quality=95)
+        return outputs
 
-    # 2. Open image
-    img = Image.open(input_path).convert("RGBA")
-    overlay = Image.new("RGBA", img.size, (255, 255, 255, 0))
-    draw_overlay = ImageDraw.Draw(overlay)
-    draw_base = ImageDraw.Draw(img)
+    # Skip regions too small to hold any legible text
+    def _large_enough(region: dict) -> bool:
+        x_min, y_min, x_max, y_max = _bbox_to_rect(region["bbox"])
+        return x_max - x_min >= 5 and y_max - y_min >= 5
 
-    # Determine font path
-    font_path = _find_font(CJK_FONT_PATHS if _is_cjk(target_lang) else LATIN_FONT_PATHS)
+    regions = [r for r in regions if _large_enough(r)]
 
-    # 3. Translate and overlay each region
-    for region in regions:
-        text = region["text"]
-        bbox = region["bbox"]
-        x_min, y_min, x_max, y_max = _bbox_to_rect(bbox)
-        box_w = x_max - x_min
-        box_h = y_max - y_min
+    # In auto mode OCR reports the detected language; make the prompt explicit
+    if source_lang == "auto" and regions:
+        source_lang = regions[0].get("source_lang", source_lang)
 
-        if box_w < 5 or box_h < 5:
-            continue
+    # 2. Translate all regions in a few structured batches. translate_segments
+    # deduplicates identical cell text, checks the cache first and returns one
+    # translation per input, so results line up with regions (and their bboxes).
+    total = len(regions) * len(targets)
+    if progress:
+        progress(0, total)
+    texts = [r["text"] for r in regions]
 
-        # Translate
-        try:
-            translated = translate_text(text, source_lang, target_lang)
-        except Exception as e:
-            logger.warning("Translation failed for region '%s': %s", text[:30], e)
-            translated = text
+    failed: dict[str, int] = {}
 
-        # Sample background color from region corners for fill
+    def translate_into(target: str) -> list[str]:
         try:
-            pixels = []
-            for px, py in [(x_min, y_min), (x_max, y_min), (x_min, y_max), (x_max, y_max)]:
-                px = max(0, min(int(px), img.width - 1))
-                py = max(0, min(int(py), img.height - 1))
-                pixels.append(img.getpixel((px, py)))
-            # Use most common or average as background
-            avg_r = sum(p[0] for p in pixels) // 4
-            avg_g = sum(p[1] for p in pixels) // 4
-            avg_b = sum(p[2] for p in pixels) // 4
-            bg_color = (avg_r, avg_g, avg_b, 255)
-        except Exception:
-            bg_color = (255, 255, 255, 255)
-
-        # Determine text color (contrast with background)
-        brightness = (bg_color[0] * 299 + bg_color[1] * 587 + bg_color[2] * 114) / 1000
-        text_color = (0, 0, 0, 255) if brightness > 128 else (255, 255, 255, 255)
-
-        # White-out original region
-        draw_base.rectangle([x_min, y_min, x_max, y_max], fill=bg_color[:3])
-
-        # Fit text
-        temp_draw = ImageDraw.Draw(img)
-        font, _ = _fit_text_size(temp_draw, translated, font_path, int(box_w), int(box_h), start_size=int(box_h))
-
-        # Draw translated text
-        draw_base.text(
-            (x_min + 1, y_min + 1),
-            translated,
-            fill=text_color[:3],
-            font=font,
-        )
-
-    # Save
-    img = img.convert("RGB")
-    img.save(output_path, quality=95)
-    return output_path
+            return translate_segments(texts, source_lang, target, strict=strict)
+        except Exception as e:
+            logger.warning("Region translation into %s failed, keeping original text: %s", target, e)
+            failed[target] = 1
+            return texts
+
+    with metrics.timer("image.translate"):
+        translations = map_ordered(translate_into, targets)
+    if progress:
+        progress(total, total)
+
+    # 3. Overlay translations; compositing paints into the array, so every
+    # target but the last gets its own copy
+    for i, (target, translated) in enumerate(zip(targets, translations)):
+        canvas = image if i == len(targets) - 1 else image.copy()
+        with metrics.timer("image.compose"):
+            run_compose(canvas, regions, translated, target, outputs[target])
+    if strict and failed:
+        raise TranslationIncomplete(failed)
+    return outputs
@@ -0,0 +1,172 @@
+"""Background job queue for file translations, persisted in SQLite."""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from app.modules import metrics
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATES = ("queued", "running")
+FINAL_STATES = ("done", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Raised from a progress callback when the job has been cancelled."""
+
+
+class JobManager:
+    """
+    Runs translation jobs on a local worker pool. Job state lives in SQLite so
+    queued and interrupted jobs are picked up again after a restart.
+
+    handler(job, progress) does the work: job is the job dict, and
+    progress(done, total) records progress and raises JobCancelled if the job
+    was cancelled in the meantime. The handler returns the output filename.
+    Each job's stage timing breakdown (see app.modules.metrics) is stored as
+    JSON in its timings column.
+    """
+
+    def __init__(self, db_path: str, handler: Callable[[dict, Callable[[int, int], None]], str], workers: int = 2):
+        self.handler = handler
+        self._lock = threading.Lock()
+        self._cancelled: set[str] = set()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, mode TEXT NOT NULL, "
+            "source_lang TEXT NOT NULL, target_lang TEXT NOT NULL, "
+            "filename TEXT, input_path TEXT NOT NULL, output_filename TEXT, "
+            "progress_done INTEGER NOT NULL DEFAULT 0, progress_total INTEGER NOT NULL DEFAULT 0, "
+            "error TEXT, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "content_hash" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN content_hash TEXT")
+        if "timings" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN timings TEXT")
+        self._conn.commit()
+
+    def submit(self, mode: str, source_lang: str, target_lang: str, input_path: str,
+               filename: str = "", content_hash: str = "") -> str:
+        """Queue a job and return its id."""
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, mode, source_lang, target_lang, filename, input_path, "
+                "content_hash, created, updated) VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, mode, source_lang, target_lang, filename, input_path, content_hash, now, now),
+            )
+            self._conn.commit()
+        self._pool.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def find_active(self, mode: str, source_lang: str, content_hash: str) -> list[dict]:
+        """
+        Queued or running jobs for the same upload and source language, oldest
+        first. Jobs being cancelled are left out.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') AND mode = ? "
+                "AND source_lang = ? AND content_hash = ? ORDER BY created",
+                (mode, source_lang, content_hash),
+            ).fetchall()
+            return [dict(row) for row in rows if row["id"] not in self._cancelled]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it already finished."""
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not row or row["status"] not in ACTIVE_STATES:
+                return False
+            self._cancelled.add(job_id)
+            if row["status"] == "queued":
+                self._set_locked(job_id, status="cancelled")
+        return True
+
+    def resume(self) -> int:
+        """Re-queue jobs left queued or running by a previous process."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, input_path FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+        resumed = 0
+        for row in rows:
+            if os.path.exists(row["input_path"]):
+                self._set(row["id"], status="queued")
+                self._pool.submit(self._run, row["id"])
+                resumed += 1
+            else:
+                self._set(row["id"], status="failed", error="Input file missing after restart")
+        if resumed:
+            logger.info("Resumed %d unfinished translation jobs", resumed)
+        return resumed
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def _run(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if not job or job["status"] not in ("queued", "cancelled"):
+            return
+        if job["status"] == "cancelled" or job_id in self._cancelled:
+            # Cancelled before it started: still remove the upload and forget the id
+            self._finish(job, status="cancelled")
+            return
+        self._set(job_id, status="running")
+
+        def progress(done: int, total: int) -> None:
+            if job_id in self._cancelled:
+                raise JobCancelled(job_id)
+            self._set(job_id, progress_done=done, progress_total=total)
+
+        with metrics.collect() as breakdown:
+            try:
+                output_filename = self.handler(job, progress)
+                fields = {"status": "done", "output_filename": output_filename}
+            except JobCancelled:
+                logger.info("Job %s cancelled", job_id)
+                fields = {"status": "cancelled"}
+            except Exception as e:
+                logger.error("Job %s failed: %s", job_id, e)
+                fields = {"status": "failed", "error": str(e)}
+        metrics.inc("jobs_total", help="Finished translation jobs", mode=job["mode"], status=fields["status"])
+        self._finish(job, timings=json.dumps(breakdown.as_dict()), **fields)
+
+    def _finish(self, job: dict, **fields) -> None:
+        self._set(job["id"], **fields)
+        self._cancelled.discard(job["id"])
+        try:
+            os.remove(job["input_path"])
+        except OSError:
+            pass
+
+    def _set(self, job_id: str, **fields) -> None:
+        with self._lock:
+            self._set_locked(job_id, **fields)
+
+    def _set_locked(self, job_id: str, **fields) -> None:
+        fields["updated"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        self._conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+        self._conn.commit()
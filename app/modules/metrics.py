@@ -0,0 +1,213 @@
+"""
+Process-wide performance metrics: stage timers, counters and gauges,
+rendered in the Prometheus text format for /metrics.
+
+A request can also collect its own timing breakdown: inside collect(), every
+stage timed and every LLM call made, on this thread or on worker threads
+started through app.modules.scheduler, is added to the returned Breakdown.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+
+PREFIX = "translator"
+
+_lock = threading.Lock()
+_stages: dict[str, list[float]] = {}            # stage -> [count, total seconds, max seconds]
+_counters: dict[tuple[str, tuple], float] = {}  # (name, labels) -> value
+_levels: dict[str, float] = {}                  # gauges moved by adjust()
+_gauges: dict[str, tuple[str | None, Callable]] = {}
+_help: dict[str, str] = {}
+
+
+class Breakdown:
+    """Stage timings and LLM usage of one request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stages: dict[str, list[float]] = {}
+        self.llm = {"calls": 0, "prompt_tokens": 0, "eval_tokens": 0, "eval_seconds": 0.0}
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def add_llm(self, prompt_tokens: int, eval_tokens: int, eval_seconds: float) -> None:
+        with self._lock:
+            self.llm["calls"] += 1
+            self.llm["prompt_tokens"] += prompt_tokens
+            self.llm["eval_tokens"] += eval_tokens
+            self.llm["eval_seconds"] += eval_seconds
+
+    def as_dict(self) -> dict:
+        """JSON-ready summary. Stage times overlap when work ran concurrently."""
+        with self._lock:
+            llm = dict(self.llm)
+            return {
+                "total_seconds": round(time.perf_counter() - self.started, 4),
+                "stages": {
+                    stage: {"count": count, "seconds": round(seconds, 4)}
+                    for stage, (count, seconds) in sorted(self.stages.items())
+                },
+                "llm": {
+                    **llm,
+                    "eval_seconds": round(llm["eval_seconds"], 4),
+                    "tokens_per_second": round(llm["eval_tokens"] / llm["eval_seconds"], 1)
+                    if llm["eval_seconds"] else 0.0,
+                },
+            }
+
+
+_breakdown: ContextVar[Breakdown | None] = ContextVar("metrics_breakdown", default=None)
+
+
+@contextmanager
+def collect() -> Iterator[Breakdown]:
+    """Collect a per-request timing breakdown for the code run inside."""
+    breakdown = Breakdown()
+    token = _breakdown.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _breakdown.reset(token)
+
+
+def observe(stage: str, seconds: float) -> None:
+    """Record one run of a pipeline stage."""
+    with _lock:
+        entry = _stages.setdefault(stage, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown.add_stage(stage, seconds)
+
+
+@contextmanager
+def timer(stage: str) -> Iterator[None]:
+    """Time the enclosed block as one run of stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def inc(name: str, value: float = 1, help: str = "", **labels: str) -> None:
+    """Increase a counter."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        if help:
+            _help.setdefault(name, help)
+
+
+def adjust(name: str, delta: float, help: str = "") -> None:
+    """Move a level gauge (in-flight requests, waiting requests) up or down."""
+    with _lock:
+        _levels[name] = _levels.get(name, 0) + delta
+        if help:
+            _help.setdefault(name, help)
+
+
+def gauge(name: str, fn: Callable[[], float | dict[str, float]], help: str = "",
+          label: str | None = None) -> None:
+    """
+    Register a gauge read at scrape time. fn returns a number, or a dict of
+    numbers keyed by the value of label.
+    """
+    with _lock:
+        _gauges[name] = (label, fn)
+        if help:
+            _help[name] = help
+
+
+def record_llm(reply: dict) -> None:
+    """Record token counts and timings from an Ollama generate reply (or final stream chunk)."""
+    prompt_tokens = int(reply.get("prompt_eval_count") or 0)
+    eval_tokens = int(reply.get("eval_count") or 0)
+    prompt_seconds = (reply.get("prompt_eval_duration") or 0) / 1e9
+    eval_seconds = (reply.get("eval_duration") or 0) / 1e9
+    inc("llm_prompt_tokens_total", prompt_tokens, help="Prompt tokens evaluated by Ollama")
+    inc("llm_eval_tokens_total", eval_tokens, help="Tokens generated by Ollama")
+    inc("llm_prompt_eval_seconds_total", prompt_seconds, help="Ollama prompt evaluation time")
+    inc("llm_eval_seconds_total", eval_seconds, help="Ollama generation time")
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown.add_llm(prompt_tokens, eval_tokens, eval_seconds)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        stages = {k: list(v) for k, v in _stages.items()}
+        counters = dict(_counters)
+        levels = dict(_levels)
+        gauges = dict(_gauges)
+        help_text = dict(_help)
+
+    lines = []
+
+    def header(name: str, kind: str, default_help: str = "") -> str:
+        full = f"{PREFIX}_{name}"
+        text = help_text.get(name, default_help)
+        if text:
+            lines.append(f"# HELP {full} {text}")
+        lines.append(f"# TYPE {full} {kind}")
+        return full
+
+    if stages:
+        full = header("stage_seconds", "summary", "Time spent in each pipeline stage")
+        for stage, (count, total, _) in sorted(stages.items()):
+            labels = _format_labels([("stage", stage)])
+            lines.append(f"{full}_count{labels} {count:g}")
+            lines.append(f"{full}_sum{labels} {total:.6f}")
+        full = header("stage_seconds_max", "gauge", "Longest single run of each pipeline stage")
+        for stage, (_, _, longest) in sorted(stages.items()):
+            lines.append(f"{full}{_format_labels([('stage', stage)])} {longest:.6f}")
+
+    for name in sorted({name for name, _ in counters}):
+        full = header(name, "counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{full}{_format_labels(labels)} {value:g}")
+
+    eval_tokens = sum(v for (n, _), v in counters.items() if n == "llm_eval_tokens_total")
+    eval_seconds = sum(v for (n, _), v in counters.items() if n == "llm_eval_seconds_total")
+    if eval_seconds:
+        full = header("llm_tokens_per_second", "gauge", "Ollama generation speed since start")
+        lines.append(f"{full} {eval_tokens / eval_seconds:.3f}")
+
+    for name, value in sorted(levels.items()):
+        lines.append(f"{header(name, 'gauge')} {value:g}")
+
+    for name, (label, fn) in sorted(gauges.items()):
+        try:
+            value = fn()
+        except Exception:
+            continue
+        full = header(name, "gauge")
+        if isinstance(value, dict):
+            for key, v in sorted(value.items()):
+                lines.append(f"{full}{_format_labels([(label or 'name', key)])} {float(v):g}")
+        else:
+            lines.append(f"{full} {float(value):g}")
+
+    return "\n".join(lines) + "\n"
@@ -1,23 +1,159 @@
 """OCR module using EasyOCR for text extraction from images."""
 
+import gc
 import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
 from PIL import Image
 import numpy as np
+from config import (
+    OCR_MAX_READERS, OCR_PRELOAD_LANGUAGES,
+    OCR_AUTO_HAN_LANG, OCR_SCRIPT_SAMPLES, OCR_SCRIPT_MIN_CONFIDENCE,
+    OCR_TILE_THRESHOLD, OCR_DETECT_MAX_SIDE, OCR_TILE_SIZE, OCR_TILE_OVERLAP,
+)
+from app.modules import metrics
 
 logger = logging.getLogger(__name__)
 
-# Lazy-loaded reader cache
-_readers: dict = {}
+
+def _rss_mb() -> float:
+    """Current resident set size of this process in MB (0 if unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is a peak, in bytes on macOS and KB on Linux
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    except Exception:
+        return 0.0
+
+
+class _ReaderEntry:
+    def __init__(self, reader, load_seconds: float, rss_delta_mb: float):
+        self.reader = reader
+        self.lock = threading.Lock()  # readtext is not safe to call concurrently
+        self.load_seconds = load_seconds
+        self.rss_delta_mb = rss_delta_mb
+        self.uses = 0
+        self.last_used = time.time()
+
+
+class ReaderManager:
+    """
+    Holds EasyOCR readers keyed by language set. At most max_readers stay
+    resident (least recently used is evicted), each language set is only
+    built once even under concurrent first requests, and calls into a reader
+    are serialized with a per-reader lock. Pinned language sets are never
+    evicted once loaded and do not count toward max_readers.
+    """
+
+    def __init__(self, max_readers: int = 2, pinned: list[list[str]] = ()):
+        self.max_readers = max(max_readers, 1)
+        self.pinned = {tuple(sorted(codes)) for codes in pinned}
+        self._lock = threading.Lock()
+        self._readers: OrderedDict[tuple, _ReaderEntry] = OrderedDict()
+        self._build_locks: dict[tuple, threading.Lock] = {}
+        self._evictions = 0
+
+    def get(self, lang_codes: list[str]) -> _ReaderEntry:
+        key = tuple(sorted(lang_codes))
+        with self._lock:
+            entry = self._readers.get(key)
+            if entry is not None:
+                self._readers.move_to_end(key)
+                return entry
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                entry = self._readers.get(key)
+            if entry is not None:
+                return entry
+            entry = self._build(lang_codes)
+            evicted = False
+            with self._lock:
+                self._readers[key] = entry
+                self._readers.move_to_end(key)
+                evictable = [k for k in self._readers if k not in self.pinned]
+                while len(evictable) > self.max_readers:
+                    old_key = evictable.pop(0)
+                    del self._readers[old_key]
+                    self._evictions += 1
+                    evicted = True
+                    logger.info("Evicted EasyOCR reader for languages: %s", list(old_key))
+        if evicted:
+            # Release the evicted model's tensors promptly
+            gc.collect()
+        return entry
+
+    def call(self, lang_codes: list[str], method: str, *args, **kwargs):
+        """Call a reader method (readtext, detect, recognize) under the reader's lock."""
+        entry = self.get(lang_codes)
+        with metrics.timer("ocr.reader_wait"):
+            entry.lock.acquire()
+        try:
+            entry.uses += 1
+            entry.last_used = time.time()
+            with metrics.timer(f"ocr.{method}"):
+                return getattr(entry.reader, method)(*args, **kwargs)
+        finally:
+            entry.lock.release()
+
+    def readtext(self, lang_codes: list[str], image, **kwargs) -> list:
+        return self.call(lang_codes, "readtext", image, **kwargs)
+
+    def preload(self, lang_sets: list[list[str]]) -> None:
+        for lang_codes in lang_sets[:self.max_readers]:
+            try:
+                self.get(lang_codes)
+            except Exception as e:
+                logger.warning("Could not preload EasyOCR reader %s: %s", lang_codes, e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            readers = [
+                {
+                    "languages": list(key),
+                    "load_seconds": round(entry.load_seconds, 2),
+                    "rss_delta_mb": round(entry.rss_delta_mb, 1),
+                    "uses": entry.uses,
+                    "busy": entry.lock.locked(),
+                    "pinned": key in self.pinned,
+                }
+                for key, entry in self._readers.items()
+            ]
+            evictions = self._evictions
+        return {
+            "max_readers": self.max_readers,
+            "readers": readers,
+            "evictions": evictions,
+            "rss_mb": round(_rss_mb(), 1),
+        }
+
+    def _build(self, lang_codes: list[str]) -> _ReaderEntry:
+        import easyocr
+        logger.info("Initializing EasyOCR reader for languages: %s", lang_codes)
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        reader = easyocr.Reader(lang_codes, gpu=False)
+        elapsed = time.perf_counter() - start
+        metrics.observe("ocr.reader_load", elapsed)
+        rss_delta = _rss_mb() - rss_before
+        logger.info("EasyOCR reader %s loaded in %.1fs (+%.0f MB)", lang_codes, elapsed, rss_delta)
+        return _ReaderEntry(reader, elapsed, rss_delta)
 
 
 def _get_reader(lang_codes: list[str]):
     """Get or create an EasyOCR reader for given languages."""
-    import easyocr
-    key = tuple(sorted(lang_codes))
-    if key not in _readers:
-        logger.info("Initializing EasyOCR reader for languages: %s", lang_codes)
-        _readers[key] = easyocr.Reader(lang_codes, gpu=False)
-    return _readers[key]
+    return _readers.get(lang_codes).reader
 
 
 # EasyOCR language code mapping
@@ -32,29 +168,307 @@ EASYOCR_LANG_MAP = {
 }
 
 
-def extract_text_from_image(image_path: str, source_lang: str = "auto") -> list[dict]:
+# Readers used to probe which script an image is in (auto-detect)
+LATIN_PROBE = ["en", "fr", "de"]   # one Latin recognition model covers all three
+HAN_KANA_PROBE = ["ja", "en"]      # Japanese model reads both kanji and kana
+HANGUL_PROBE = ["ko", "en"]
+
+# Auto mode cycles through the probe readers on every image; pin them so
+# alternating Chinese and Korean uploads do not evict and reload a model
+_readers = ReaderManager(OCR_MAX_READERS, pinned=[LATIN_PROBE, HAN_KANA_PROBE, HANGUL_PROBE])
+
+# Function words that separate the Latin-script languages we support
+_LATIN_STOPWORDS = {
+    "en": {"the", "and", "of", "to", "in", "is", "for", "with", "on", "by"},
+    "fr": {"le", "la", "les", "des", "et", "du", "est", "une", "pour", "dans"},
+    "de": {"der", "die", "das", "und", "ist", "nicht", "mit", "für", "von", "zu"},
+}
+
+
+def classify_script(text: str) -> str | None:
+    """Map recognized text to a language code by Unicode block, or None if no letters."""
+    hangul = kana = han = latin = 0
+    for ch in text:
+        cp = ord(ch)
+        if 0xAC00 <= cp <= 0xD7AF or 0x1100 <= cp <= 0x11FF or 0x3130 <= cp <= 0x318F:
+            hangul += 1
+        elif 0x3040 <= cp <= 0x30FF:
+            kana += 1
+        elif 0x4E00 <= cp <= 0x9FFF or 0x3400 <= cp <= 0x4DBF:
+            han += 1
+        elif ch.isalpha() and cp < 0x0250:
+            latin += 1
+    if hangul and hangul >= kana + han:
+        return "ko"
+    if kana:
+        return "ja"
+    if han:
+        return OCR_AUTO_HAN_LANG
+    if latin:
+        return _guess_latin_lang(text)
+    return None
+
+
+def _guess_latin_lang(text: str) -> str:
+    lowered = text.lower()
+    if any(ch in lowered for ch in "äöüß"):
+        return "de"
+    if any(ch in lowered for ch in "éèêàçœ"):
+        return "fr"
+    words = set(lowered.split())
+    scores = {lang: len(words & stop) for lang, stop in _LATIN_STOPWORDS.items()}
+    best = max(scores, key=scores.get)
+    return best if scores[best] else "en"
+
+
+def _probe(lang_codes: list[str], image, boxes: list) -> tuple[str, float]:
+    """Recognize the sample boxes with one reader; return (joined text, mean confidence)."""
+    results = _readers.call(lang_codes, "recognize", image, horizontal_list=boxes, free_list=[], detail=1)
+    if not results:
+        return "", 0.0
+    text = " ".join(r[1] for r in results)
+    return text, sum(float(r[2]) for r in results) / len(results)
+
+
+def _detect_boxes(image, lang_codes: list[str] = LATIN_PROBE) -> tuple[list, list]:
+    """Text boxes of one image: (horizontal [x0, x1, y0, y1] boxes, free-form polygons)."""
+    horizontal, free = _readers.call(lang_codes, "detect", image)
+    return (horizontal[0] if horizontal else []), (free[0] if free else [])
+
+
+def _classify_boxes(image, boxes: list) -> str:
     """
-    Extract text regions from an image.
-    Returns list of dicts: {text, bbox, confidence}
-    bbox is [[x1,y1],[x2,y2],[x3,y3],[x4,y4]]
+    Recognize a few of the largest boxes with the Latin model and, only if
+    that fails, with the Han/kana and Hangul models, then classify by
+    Unicode block. Returns "auto" if no probe reaches
+    OCR_SCRIPT_MIN_CONFIDENCE, so the prompt does not name a guessed language.
+    """
+    # Largest boxes first: most characters, most reliable recognition
+    boxes = sorted(boxes, key=lambda b: (b[1] - b[0]) * (b[3] - b[2]), reverse=True)[:OCR_SCRIPT_SAMPLES]
+
+    text, confidence = _probe(LATIN_PROBE, image, boxes)
+    if confidence >= OCR_SCRIPT_MIN_CONFIDENCE and classify_script(text) in ("en", "fr", "de"):
+        return classify_script(text)
+
+    text, confidence = _probe(HAN_KANA_PROBE, image, boxes)
+    lang = classify_script(text)
+    if confidence >= OCR_SCRIPT_MIN_CONFIDENCE and lang in ("ja", OCR_AUTO_HAN_LANG):
+        return lang
+
+    ko_text, ko_confidence = _probe(HANGUL_PROBE, image, boxes)
+    ko_confident = ko_confidence >= OCR_SCRIPT_MIN_CONFIDENCE and ko_confidence > confidence
+    if ko_confident and classify_script(ko_text) == "ko":
+        return "ko"
+    return "auto"
+
+
+def detect_source_lang(image) -> str | None:
+    """
+    Cheap script detection for auto mode: find text boxes once and classify
+    a sample of them (see _classify_boxes).
+    Returns a language code from config.LANGUAGES, or None if no text was found.
     """
+    horizontal, _free = _detect_boxes(image)
+    return _classify_boxes(image, horizontal) if horizontal else None
+
+
+def _lang_codes_for(source_lang: str) -> list[str]:
+    """EasyOCR language set for a source language code."""
     if source_lang == "auto":
-        # Load broad language set so OCR can detect CJK + Latin text
-        lang_codes = ["en", "ch_tra", "ja", "ko"]
+        # Auto mode always starts with the Latin probe reader
+        return LATIN_PROBE
+    code = EASYOCR_LANG_MAP.get(source_lang, "en")
+    # EasyOCR often needs 'en' alongside CJK languages
+    return [code] if code == "en" else [code, "en"]
+
+
+def preload_readers(source_langs: list[str] | None = None) -> None:
+    """Load readers for the configured source languages ahead of the first request."""
+    langs = OCR_PRELOAD_LANGUAGES if source_langs is None else source_langs
+    _readers.preload([_lang_codes_for(lang) for lang in langs])
+
+
+def reader_stats() -> dict:
+    """Resident readers, their load times and memory, and process RSS."""
+    return _readers.stats()
+
+
+def _open_image(image) -> Image.Image:
+    """Lazily open a file path, or wrap an array, as a PIL image."""
+    if isinstance(image, np.ndarray):
+        return Image.fromarray(image)
+    return Image.open(image)
+
+
+def _image_size(image) -> tuple[int, int]:
+    if isinstance(image, np.ndarray):
+        return image.shape[1], image.shape[0]
+    with Image.open(image) as img:
+        return img.size
+
+
+def _is_large(size: tuple[int, int]) -> bool:
+    return max(size) > OCR_TILE_THRESHOLD
+
+
+def _detection_view(image, max_side: int) -> tuple[np.ndarray, float]:
+    """Downscaled RGB copy for text detection, and its scale factor."""
+    img = _open_image(image)
+    w, h = img.size
+    scale = min(1.0, max_side / max(w, h))
+    target = (max(1, round(w * scale)), max(1, round(h * scale)))
+    if img.format == "JPEG":
+        # Let libjpeg decode at reduced size instead of decoding full resolution first
+        img.draft("RGB", target)
+    small = img.convert("RGB").resize(target, Image.BILINEAR)
+    return np.asarray(small), target[0] / w
+
+
+def _rect_of(points) -> tuple[float, float, float, float]:
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _dedupe_results(results: list, iou_threshold: float = 0.5) -> list:
+    """Drop boxes that overlap a higher-confidence box by more than iou_threshold."""
+    if len(results) < 2:
+        return results
+    order = sorted(range(len(results)), key=lambda i: -float(results[i][2]))
+    rects = np.array([_rect_of(results[i][0]) for i in order], dtype=np.float64)
+    areas = (rects[:, 2] - rects[:, 0]) * (rects[:, 3] - rects[:, 1])
+    kept: list[int] = []
+    for n in range(len(order)):
+        if kept:
+            k = np.array(kept)
+            iw = np.minimum(rects[k, 2], rects[n, 2]) - np.maximum(rects[k, 0], rects[n, 0])
+            ih = np.minimum(rects[k, 3], rects[n, 3]) - np.maximum(rects[k, 1], rects[n, 1])
+            inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+            union = areas[k] + areas[n] - inter
+            if np.any(inter > iou_threshold * np.maximum(union, 1e-9)):
+                continue
+        kept.append(n)
+    return [results[order[n]] for n in sorted(kept, key=lambda n: order[n])]
+
+
+def _readtext_tiled(lang_codes: list[str], image, detection: tuple[list, list, float] | None = None) -> list:
+    """
+    OCR for large scans: detect text on a downscaled copy, then recognize the
+    detected boxes tile by tile from the full-resolution image. Detector memory
+    is bounded by OCR_DETECT_MAX_SIDE and recognizer input by OCR_TILE_SIZE
+    rather than by the scan size. detection, if given, is (horizontal, free,
+    scale) from an earlier detect on that copy, which is then reused.
+    Returns EasyOCR-style (bbox, text, conf).
+    """
+    if detection is None:
+        small, scale = _detection_view(image, OCR_DETECT_MAX_SIDE)
+        horizontal, free = _detect_boxes(small, lang_codes)
+        del small
     else:
-        code = EASYOCR_LANG_MAP.get(source_lang, "en")
-        # EasyOCR often needs 'en' alongside CJK languages
-        lang_codes = [code] if code == "en" else [code, "en"]
+        horizontal, free, scale = detection
+    pad = math.ceil(2 / scale)  # detection on the small copy is coarse; pad boxes a little
+
+    # Boxes in full-resolution coordinates, as (x_min, y_min, x_max, y_max, polygon or None)
+    boxes = []
+    for x0, x1, y0, y1 in horizontal:
+        boxes.append((x0 / scale - pad, y0 / scale - pad, x1 / scale + pad, y1 / scale + pad, None))
+    for poly in free:
+        pts = [[x / scale, y / scale] for x, y in poly]
+        boxes.append((*_rect_of(pts), pts))
+    if not boxes:
+        return []
+
+    full = _open_image(image)
+    if full.mode != "RGB":
+        full = full.convert("RGB")
+    w, h = full.size
+
+    # Assign each box to the tile containing its center
+    tiles: dict[tuple[int, int], list] = {}
+    for box in boxes:
+        cx = (box[0] + box[2]) / 2
+        cy = (box[1] + box[3]) / 2
+        tiles.setdefault((int(cx // OCR_TILE_SIZE), int(cy // OCR_TILE_SIZE)), []).append(box)
 
+    results = []
+    for tile_boxes in tiles.values():
+        # Crop just enough around this tile's boxes (overlapping neighbours if a box straddles)
+        left = max(0, int(min(b[0] for b in tile_boxes)) - OCR_TILE_OVERLAP)
+        top = max(0, int(min(b[1] for b in tile_boxes)) - OCR_TILE_OVERLAP)
+        right = min(w, int(math.ceil(max(b[2] for b in tile_boxes))) + OCR_TILE_OVERLAP)
+        bottom = min(h, int(math.ceil(max(b[3] for b in tile_boxes))) + OCR_TILE_OVERLAP)
+        crop = np.asarray(full.crop((left, top, right, bottom)))
+
+        local_h, local_f = [], []
+        for x0, y0, x1, y1, poly in tile_boxes:
+            if poly is None:
+                local_h.append([
+                    max(0, int(x0) - left), min(right - left, int(math.ceil(x1)) - left),
+                    max(0, int(y0) - top), min(bottom - top, int(math.ceil(y1)) - top),
+                ])
+            else:
+                local_f.append([[int(x - left), int(y - top)] for x, y in poly])
+
+        for bbox, text, confidence in _readers.call(
+            lang_codes, "recognize", crop, horizontal_list=local_h, free_list=local_f, detail=1
+        ):
+            results.append(([[x + left, y + top] for x, y in bbox], text, confidence))
+
+    return _dedupe_results(results)
+
+
+def extract_text_from_image(image_path, source_lang: str = "auto") -> list[dict]:
+    """
+    Extract text regions from an image (file path or RGB array).
+    Returns list of dicts: {text, bbox, confidence, source_lang}
+    bbox is [[x1,y1],[x2,y2],[x3,y3],[x4,y4]]
+    In auto mode the script is detected first and the smallest matching
+    reader is used; source_lang holds the detected language ("auto" if unsure).
+    The text boxes found by the probe are reused, so detection runs once.
+    Scans larger than OCR_TILE_THRESHOLD are detected downscaled and
+    recognized in native-resolution tiles.
+    """
     try:
-        reader = _get_reader(lang_codes)
-        results = reader.readtext(image_path)
+        large = _is_large(_image_size(image_path))
+        detection = None
+        if source_lang == "auto":
+            if large:
+                probe_image, scale = _detection_view(image_path, OCR_DETECT_MAX_SIDE)
+            else:
+                probe_image, scale = image_path, 1.0
+            with metrics.timer("ocr.detect_language"):
+                horizontal, free = _detect_boxes(probe_image)
+                if not horizontal:
+                    return []
+                detected = _classify_boxes(probe_image, horizontal)
+            del probe_image
+            if detected == "auto":
+                logger.info("OCR source language unclear; reading with the Latin model")
+            else:
+                logger.info("Auto-detected OCR source language: %s", detected)
+            lang_codes = LATIN_PROBE if detected in ("en", "fr", "de") else _lang_codes_for(detected)
+            source_lang = detected
+            detection = (horizontal, free, scale)
+        else:
+            lang_codes = _lang_codes_for(source_lang)
+
+        if large:
+            results = _readtext_tiled(lang_codes, image_path, detection)
+        elif detection is not None:
+            horizontal, free, _ = detection
+            results = _readers.call(
+                lang_codes, "recognize", image_path, horizontal_list=horizontal, free_list=free, detail=1
+            )
+        else:
+            results = _readers.readtext(lang_codes, image_path)
         regions = []
         for bbox, text, confidence in results:
             regions.append({
                 "text": text,
-                "bbox": bbox,  # list of 4 [x,y] points
+                # list of 4 [x,y] points, as plain ints so regions pickle/serialize cheaply
+                "bbox": [[int(round(float(x))), int(round(float(y)))] for x, y in bbox],
                 "confidence": float(confidence),
+                "source_lang": source_lang,
             })
         return regions
     except Exception as e:
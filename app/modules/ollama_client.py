@@ -0,0 +1,297 @@
+"""Pooled, keep-alive HTTP client for the Ollama API, and a pool of Ollama backends."""
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    OLLAMA_MAX_PARALLEL, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT,
+    OLLAMA_HTTP_RETRIES, OLLAMA_HTTP_BACKOFF, OLLAMA_HEALTH_INTERVAL, OLLAMA_EJECT_AFTER,
+)
+from app.modules import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaClient:
+    """
+    Thread-safe wrapper around one requests.Session per Ollama server.
+    Connections are pooled and kept alive between calls; transient failures
+    (connection resets, 5xx) are retried with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_size: int = OLLAMA_MAX_PARALLEL,
+        connect_timeout: float = OLLAMA_CONNECT_TIMEOUT,
+        read_timeout: float = OLLAMA_READ_TIMEOUT,
+        retries: int = OLLAMA_HTTP_RETRIES,
+        backoff: float = OLLAMA_HTTP_BACKOFF,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        # urllib3 connection pools are thread-safe; we never use cookies or
+        # per-request session state, so one Session is shared by all threads.
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1), max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def request(
+        self, method: str, path: str, timeout: float | None = None, retries: int | None = None, **kwargs
+    ) -> requests.Response:
+        """Send a request, retrying connection errors and 5xx responses."""
+        url = f"{self.base_url}{path}"
+        timeout = (self.connect_timeout, timeout if timeout is not None else self.read_timeout)
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                resp = self._session.request(method, url, timeout=timeout, **kwargs)
+                if resp.status_code >= 500 and attempt < retries:
+                    logger.warning("Ollama %s %s returned %d, retrying", method, path, resp.status_code)
+                    resp.close()
+                else:
+                    resp.raise_for_status()
+                    return resp
+            except requests.ConnectionError as e:
+                if attempt >= retries:
+                    raise
+                logger.warning("Ollama connection error on %s %s: %s, retrying", method, path, e)
+            self._sleep(attempt)
+        raise RuntimeError(f"Ollama request failed: {method} {path}")
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def close(self) -> None:
+        self._session.close()
+
+    def _sleep(self, attempt: int) -> None:
+        # Full jitter: spread retries from concurrent workers apart
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+
+class _Backend:
+    def __init__(self, url: str, weight: float, max_concurrency: int, retries: int):
+        self.url = url.rstrip("/")
+        self.weight = max(float(weight), 0.01)
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.client = OllamaClient(self.url, pool_size=self.max_concurrency, retries=retries)
+        self.outstanding = 0
+        self.healthy = True
+        self.reachable = True
+        self.failures = 0  # consecutive
+        self.requests = 0
+        self.errors = 0
+        self.models: list[str] = []
+
+
+class BackendPool:
+    """
+    Spreads Ollama requests over one or more servers. Each request goes to the
+    healthy backend with the fewest outstanding requests relative to its
+    weight; callers wait when every backend is at its max_concurrency, so the
+    pool is also the global cap on in-flight requests.
+
+    A backend that fails eject_after requests in a row (connection errors,
+    5xx), or fails a health check, is ejected; a background health check
+    every health_interval seconds re-admits it once it answers and has the
+    model. A request that fails on one backend is retried on the others. If
+    every backend is ejected, requests are still attempted on them rather
+    than failing outright.
+    """
+
+    def __init__(self, backends: list[dict], model: str | None = None,
+                 health_interval: float = OLLAMA_HEALTH_INTERVAL, eject_after: int = OLLAMA_EJECT_AFTER):
+        if not backends:
+            raise ValueError("BackendPool needs at least one backend")
+        # With a single server, retry on it; with several, fail over quickly instead
+        retries = OLLAMA_HTTP_RETRIES if len(backends) == 1 else 1
+        self.backends = [
+            _Backend(b["url"], b.get("weight", 1), b.get("max_concurrency", OLLAMA_MAX_PARALLEL), retries)
+            for b in backends
+        ]
+        self.model = model
+        self.health_interval = health_interval
+        self.eject_after = max(eject_after, 1)
+        self._cond = threading.Condition()
+        self._health_thread: threading.Thread | None = None
+        self._closed = threading.Event()
+
+        metrics.gauge("llm_backend_outstanding", lambda: {b.url: b.outstanding for b in self.backends},
+                      help="Requests in flight per Ollama backend", label="backend")
+        metrics.gauge("llm_backend_healthy", lambda: {b.url: int(b.healthy) for b in self.backends},
+                      help="1 if the Ollama backend is in rotation", label="backend")
+
+    def acquire(self, exclude: list[_Backend] = ()) -> _Backend:
+        """Reserve a slot on the best backend not in exclude, waiting for one to free up."""
+        self._start_health_checks()
+        metrics.adjust("llm_requests_waiting", 1, help="Ollama requests waiting for a free slot")
+        try:
+            with metrics.timer("llm.queue_wait"), self._cond:
+                while True:
+                    backend = self._pick(exclude)
+                    if backend is not None:
+                        break
+                    self._cond.wait()
+                backend.outstanding += 1
+        finally:
+            metrics.adjust("llm_requests_waiting", -1)
+        metrics.adjust("llm_requests_in_flight", 1, help="Ollama requests in progress")
+        return backend
+
+    def release(self, backend: _Backend, ok: bool | None = True) -> None:
+        """Return a slot. ok=False counts a backend failure, None records nothing."""
+        metrics.adjust("llm_requests_in_flight", -1)
+        with self._cond:
+            backend.outstanding -= 1
+            backend.requests += 1
+            if ok is False:
+                backend.errors += 1
+                backend.failures += 1
+                if backend.failures >= self.eject_after:
+                    self._eject(backend, f"{backend.failures} consecutive failures")
+            elif ok:
+                backend.failures = 0
+            self._cond.notify_all()
+
+    @contextmanager
+    def call(self, method: str, path: str, **kwargs) -> Iterator[requests.Response]:
+        """
+        Send a request through the pool and yield the response while its slot
+        is held (so streamed responses count as outstanding until consumed).
+        Connection errors and 5xx responses fail over to the next backend.
+        """
+        tried: list[_Backend] = []
+        while True:
+            backend = self.acquire(exclude=tried)
+            started = time.perf_counter()
+            try:
+                resp = backend.client.request(method, path, **kwargs)
+            except (requests.ConnectionError, requests.HTTPError) as e:
+                status = getattr(e.response, "status_code", None)
+                failed = status is None or status >= 500
+                self.release(backend, ok=False if failed else None)
+                tried.append(backend)
+                if not failed or len(tried) >= len(self.backends):
+                    raise
+                logger.warning("Ollama backend %s failed (%s), failing over", backend.url, e)
+                metrics.inc("llm_failovers_total", help="Requests retried on another Ollama backend")
+                continue
+            except BaseException:
+                self.release(backend, ok=None)
+                raise
+            break
+
+        ok = True
+        try:
+            yield resp
+        except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+            ok = False
+            raise
+        finally:
+            resp.close()
+            metrics.observe("llm.request", time.perf_counter() - started)
+            self.release(backend, ok)
+
+    def check(self, backend: _Backend) -> bool:
+        """Probe one backend (/api/tags); eject or re-admit it accordingly."""
+        try:
+            resp = backend.client.get("/api/tags", timeout=5, retries=0)
+            models = [m["name"] for m in resp.json().get("models", [])]
+            reachable, error = True, None
+        except Exception as e:
+            models, reachable, error = [], False, str(e)
+        has_model = not self.model or any(self.model in m for m in models)
+        with self._cond:
+            backend.reachable = reachable
+            backend.models = models
+            if reachable and has_model:
+                if not backend.healthy:
+                    logger.info("Ollama backend %s is healthy again, re-admitting", backend.url)
+                    metrics.inc("llm_backend_readmissions_total", help="Ollama backends returned to rotation")
+                backend.healthy = True
+                backend.failures = 0
+                self._cond.notify_all()
+            else:
+                self._eject(backend, error or f"model {self.model} not available")
+        return backend.healthy
+
+    def check_all(self) -> list[dict]:
+        """Probe every backend and return stats()."""
+        for backend in self.backends:
+            self.check(backend)
+        return self.stats()
+
+    def stats(self) -> list[dict]:
+        with self._cond:
+            return [
+                {
+                    "url": b.url,
+                    "weight": b.weight,
+                    "max_concurrency": b.max_concurrency,
+                    "outstanding": b.outstanding,
+                    "healthy": b.healthy,
+                    "reachable": b.reachable,
+                    "requests": b.requests,
+                    "errors": b.errors,
+                    "models": list(b.models),
+                }
+                for b in self.backends
+            ]
+
+    def close(self) -> None:
+        """Stop the health checks and close every backend's connections."""
+        self._closed.set()
+        if self._health_thread is not None:
+            self._health_thread.join()
+        for backend in self.backends:
+            backend.client.close()
+
+    def _pick(self, exclude) -> _Backend | None:
+        """Least outstanding requests per unit of weight, among backends with a free slot."""
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            raise RuntimeError("No Ollama backend left to try")
+        # Every backend ejected: keep trying them rather than failing outright
+        rotation = [b for b in candidates if b.healthy] or candidates
+        free = [b for b in rotation if b.outstanding < b.max_concurrency]
+        if not free:
+            return None
+        return min(free, key=lambda b: (b.outstanding + 1) / b.weight)
+
+    def _eject(self, backend: _Backend, reason: str) -> None:
+        # Caller holds self._cond
+        if backend.healthy:
+            logger.warning("Ejecting Ollama backend %s: %s", backend.url, reason)
+            metrics.inc("llm_backend_ejections_total", help="Ollama backends taken out of rotation")
+        backend.healthy = False
+
+    def _start_health_checks(self) -> None:
+        # Only worth a background thread when there is somewhere else to route to
+        if self._health_thread is not None or len(self.backends) < 2 or self._closed.is_set():
+            return
+        with self._cond:
+            if self._health_thread is None:
+                self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+                self._health_thread.start()
+
+    def _health_loop(self) -> None:
+        while not self._closed.wait(self.health_interval):
+            try:
+                self.check_all()
+            except Exception as e:
+                logger.warning("Ollama health check failed: %s", e)
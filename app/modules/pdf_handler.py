@@ -1,126 +1,354 @@
 """PDF text extraction and translated PDF reconstruction using PyMuPDF."""
 
+import hashlib
 import logging
-import os
+from typing import Callable
 import fitz  # PyMuPDF
-from config import CJK_FONT_PATHS, LATIN_FONT_PATHS
-from app.modules.translator import translate_text
+import numpy as np
+from config import (
+    PDF_STREAM_MIN_PAGES, PDF_STREAM_FLUSH_PAGES, CHECKPOINT_DB_PATH,
+    PDF_OCR_ENABLED, PDF_OCR_DPI,
+)
+from app.modules.fonts import font_path_for, get_fitz_font
+from app.modules.translator import translate_segments, document_key, TranslationIncomplete
+from app.modules.checkpoint import CheckpointStore, file_sha256
+from app.modules.scheduler import imap_ordered, map_ordered
+from app.modules.workers import run_ocr
+from app.modules import metrics
 
 logger = logging.getLogger(__name__)
 
+_checkpoints = CheckpointStore(CHECKPOINT_DB_PATH)
 
-def _find_font(paths: list[str]) -> str | None:
-    for p in paths:
-        if os.path.exists(p):
-            return p
-    return None
 
+def _extract_page_edits(page) -> list[dict]:
+    """Collect the non-empty text spans on a page with their layout properties."""
+    blocks = page.get_text("dict", flags=fitz.TEXT_PRESERVE_WHITESPACE)["blocks"]
+    edits = []
+    for block in blocks:
+        if block.get("type") != 0:  # text block
+            continue
+        for line in block.get("lines", []):
+            for span in line.get("spans", []):
+                text = span.get("text", "").strip()
+                if not text:
+                    continue
+                edits.append({
+                    "bbox": fitz.Rect(span["bbox"]),
+                    "text": text,
+                    "size": span.get("size", 11),
+                    "color": span.get("color", 0),
+                    "origin": fitz.Point(span["origin"]) if "origin" in span else None,
+                })
+    return edits
+
+
+def _needs_ocr(page, edits: list[dict]) -> bool:
+    """Classify a page: no text layer but some embedded image means a scanned page."""
+    return PDF_OCR_ENABLED and not edits and bool(page.get_images(full=False))
+
+
+def _rasterize(page, dpi: int) -> np.ndarray:
+    """Render a page to an RGB array for OCR."""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n).copy()
+
+
+def _ocr_page_edits(image: np.ndarray, page_rect: fitz.Rect, dpi: int, source_lang: str) -> tuple[list[dict], str]:
+    """OCR a rasterized page; return edits in PDF coordinates and the detected source language."""
+    scale = 72.0 / dpi
+    edits = []
+    detected = source_lang
+    for region in run_ocr(image, source_lang):
+        xs = [p[0] for p in region["bbox"]]
+        ys = [p[1] for p in region["bbox"]]
+        rect = fitz.Rect(
+            page_rect.x0 + min(xs) * scale, page_rect.y0 + min(ys) * scale,
+            page_rect.x0 + max(xs) * scale, page_rect.y0 + max(ys) * scale,
+        )
+        if rect.is_empty or not region["text"].strip():
+            continue
+        detected = region.get("source_lang", detected)
+        edits.append({
+            "bbox": rect,
+            "text": region["text"].strip(),
+            "size": max(rect.height * 0.8, 5),
+            "color": 0,
+            "origin": None,
+        })
+    return edits, detected
+
+
+def _render_page(page, edits: list[dict], translated_texts: list[str], font_path: str | None) -> None:
+    """Redact original spans on a page and write their translations in place."""
+    font = get_fitz_font(font_path)
+    # One TextWriter per text color, written once after all spans are laid out
+    writers: dict[tuple, fitz.TextWriter] = {}
+
+    for edit, translated in zip(edits, translated_texts):
+        rect = edit["bbox"]
+        # White-out the original text area
+        page.draw_rect(rect, color=None, fill=(1, 1, 1))
+
+        # Insert translated text
+        fontsize = edit["size"]
+        # Shrink font if translated text is longer to fit in same box
+        text_width = font.text_length(translated, fontsize=fontsize)
+        rect_width = rect.width
+        if text_width > rect_width and rect_width > 0:
+            fontsize = fontsize * rect_width / text_width
+            fontsize = max(fontsize, 5)  # minimum readable size
 
-def _is_cjk_target(target_lang: str) -> bool:
-    return target_lang in ("zh-TW", "zh-CN", "ja", "ko")
+        insertion_point = edit["origin"] if edit["origin"] else rect.tl + fitz.Point(0, fontsize)
 
+        # Convert int color to RGB tuple
+        c = edit["color"]
+        if isinstance(c, int):
+            r = ((c >> 16) & 0xFF) / 255.0
+            g = ((c >> 8) & 0xFF) / 255.0
+            b = (c & 0xFF) / 255.0
+            color = (r, g, b)
+        else:
+            color = (0, 0, 0)
 
-def translate_pdf(input_path: str, source_lang: str, target_lang: str, output_path: str) -> str:
+        try:
+            tw = writers.get(color)
+            if tw is None:
+                tw = writers[color] = fitz.TextWriter(page.rect)
+            tw.append(insertion_point, translated, font=font, fontsize=fontsize)
+        except Exception as e:
+            logger.warning("Failed to write text at %s: %s", rect, e)
+            # Fallback: simple insert
+            page.insert_text(insertion_point, translated, fontsize=fontsize)
+
+    for color, tw in writers.items():
+        tw.write_text(page, color=color)
+
+
+class _StreamingWriter:
     """
-    Translate a PDF: extract text blocks, translate them, rebuild the PDF
-    preserving layout (position, font size, color).
-    Returns the output file path.
+    Assembles translated pages into output_path, flushing every few pages.
+    The first flush writes a complete PDF; later flushes append incrementally,
+    and the document is reopened after each flush so finished pages are not
+    kept in memory. If the process dies, the pages flushed so far are usable.
     """
-    doc = fitz.open(input_path)
-    
-    # Determine font to use
-    if _is_cjk_target(target_lang):
-        font_path = _find_font(CJK_FONT_PATHS)
-        fontname = "cjk-font"
+
+    def __init__(self, output_path: str, flush_every: int):
+        self.output_path = output_path
+        self.flush_every = max(flush_every, 1)
+        self.out = fitz.open()
+        self.saved = False
+        self.unflushed = 0
+
+    def add_page(self, src_doc, page_num: int):
+        """Copy a source page into the output and return it for rendering."""
+        self.out.insert_pdf(src_doc, from_page=page_num, to_page=page_num)
+        return self.out[self.out.page_count - 1]
+
+    def page_done(self) -> None:
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.saved and not self.unflushed:
+            return
+        with metrics.timer("pdf.save"):
+            if self.saved:
+                self.out.saveIncr()
+            else:
+                self.out.save(self.output_path)
+                self.saved = True
+            self.out.close()
+            self.out = fitz.open(self.output_path)
+        self.unflushed = 0
+
+    def close(self) -> None:
+        if self.out.page_count or self.saved:
+            self.flush()
+        self.out.close()
+
+
+def translate_pdf(
+    input_file: str | bytes,
+    source_lang: str,
+    target_lang: str,
+    output_path: str,
+    progress: Callable[[int, int], None] | None = None,
+    streaming: bool | None = None,
+    resume: bool = True,
+    content_hash: str | None = None,
+) -> str:
+    """
+    Translate a PDF (a path or the raw bytes): extract text blocks, translate
+    them, rebuild the PDF preserving layout (position, font size, color).
+    See translate_pdf_multi for the pipeline. Returns the output file path.
+    """
+    translate_pdf_multi(
+        input_file, source_lang, {target_lang: output_path},
+        progress=progress, streaming=streaming, resume=resume, content_hash=content_hash,
+    )
+    return output_path
+
+
+def translate_pdf_multi(
+    input_file: str | bytes,
+    source_lang: str,
+    outputs: dict[str, str],
+    progress: Callable[[int, int], None] | None = None,
+    streaming: bool | None = None,
+    resume: bool = True,
+    content_hash: str | None = None,
+    strict: bool = False,
+) -> dict[str, str]:
+    """
+    Translate a PDF into one or more target languages in a single pass.
+    outputs maps each target language to its output path. Extraction and OCR
+    of scanned pages (rasterized at PDF_OCR_DPI) happen once per page and are
+    shared by every target; each page is translated into all targets
+    concurrently and rendered into one output per target.
+
+    Pages flow through three stages: extraction (in order), translation
+    (concurrent, a bounded number of pages ahead) and rendering (in order).
+    In streaming mode, rendered pages are written to the outputs in batches
+    so memory stays flat for very large documents; by default streaming is
+    used from PDF_STREAM_MIN_PAGES pages up.
+
+    With resume set, each page's translations are checkpointed as they
+    finish (keyed on the input file hash, languages and model), and pages
+    already checkpointed by an earlier, interrupted run are not re-translated.
+
+    progress(pages_done, total_pages) is called as pages are written.
+    Pages that fail to translate keep their original text; with strict set,
+    TranslationIncomplete is raised once every output has been written.
+    Returns outputs.
+    """
+    targets = list(outputs)
+    if isinstance(input_file, (bytes, bytearray, memoryview)):
+        doc = fitz.open(stream=bytes(input_file), filetype="pdf")
     else:
-        font_path = _find_font(LATIN_FONT_PATHS)
-        fontname = "latin-font"
+        doc = fitz.open(input_file)
+
+    # Determine font to use per target
+    font_paths = {target: font_path_for(target) for target in targets}
 
     total_pages = len(doc)
-    
-    for page_num in range(total_pages):
-        page = doc[page_num]
-        blocks = page.get_text("dict", flags=fitz.TEXT_PRESERVE_WHITESPACE)["blocks"]
-        
-        # Collect text spans with their properties
-        edits = []
-        for block in blocks:
-            if block.get("type") != 0:  # text block
-                continue
-            for line in block.get("lines", []):
-                for span in line.get("spans", []):
-                    text = span.get("text", "").strip()
-                    if not text:
-                        continue
-                    edits.append({
-                        "bbox": fitz.Rect(span["bbox"]),
-                        "text": text,
-                        "size": span.get("size", 11),
-                        "color": span.get("color", 0),
-                        "origin": fitz.Point(span["origin"]) if "origin" in span else None,
-                    })
-
-        if not edits:
-            continue
+    if streaming is None:
+        streaming = total_pages >= PDF_STREAM_MIN_PAGES
+    if progress:
+        progress(0, total_pages)
 
-        # Batch translate all text on this page
-        original_texts = [e["text"] for e in edits]
-        combined = "\n|||DELIM|||\n".join(original_texts)
-        
+    def extract_pages():
+        # Producer stage: runs on the calling thread, since fitz is not thread-safe.
+        # Pages with a text layer use the cheap span extraction; image-only pages
+        # are rasterized here and OCR'd in the translation stage.
+        for page_num in range(total_pages):
+            page = doc[page_num]
+            with metrics.timer("pdf.extract"):
+                edits = _extract_page_edits(page)
+            if _needs_ocr(page, edits):
+                with metrics.timer("pdf.rasterize"):
+                    raster = _rasterize(page, PDF_OCR_DPI)
+                yield page_num, edits, (raster, page.rect)
+            else:
+                yield page_num, edits, None
+
+    doc_keys: dict[str, str] = {}
+    if resume:
+        if not content_hash:
+            content_hash = (
+                file_sha256(input_file) if isinstance(input_file, str)
+                else hashlib.sha256(input_file).hexdigest()
+            )
+        doc_keys = {target: document_key(content_hash, source_lang, target) for target in targets}
+    completed = {target: _checkpoints.load(key) for target, key in doc_keys.items()}
+    for target, pages in completed.items():
+        if pages:
+            logger.info("Resuming %s translation: %d of %d pages already translated",
+                        target, len(pages), total_pages)
+    failed_pages: dict[str, list[int]] = {target: [] for target in targets}
+
+    def translate_into(page_num: int, texts: list[str], page_lang: str, target: str) -> list[str]:
+        saved = completed.get(target, {}).get(page_num)
+        if saved is not None and len(saved) == len(texts):
+            return saved
         try:
-            translated_combined = translate_text(combined, source_lang, target_lang)
-            translated_texts = translated_combined.split("\n|||DELIM|||\n")
-            # Pad if split produced fewer items
-            while len(translated_texts) < len(original_texts):
-                translated_texts.append(original_texts[len(translated_texts)])
+            with metrics.timer("pdf.translate"):
+                translated = translate_segments(texts, page_lang, target, strict=True)
         except Exception as e:
-            logger.warning("Page %d translation failed, keeping original: %s", page_num + 1, e)
-            translated_texts = original_texts
-
-        # Redact original text and insert translations
-        for edit, translated in zip(edits, translated_texts):
-            rect = edit["bbox"]
-            # White-out the original text area
-            page.draw_rect(rect, color=None, fill=(1, 1, 1))
-            
-            # Insert translated text
-            fontsize = edit["size"]
-            # Shrink font if translated text is longer to fit in same box
-            text_width = fitz.get_text_length(translated, fontsize=fontsize)
-            rect_width = rect.width
-            if text_width > rect_width and rect_width > 0:
-                fontsize = fontsize * rect_width / text_width
-                fontsize = max(fontsize, 5)  # minimum readable size
-
-            insertion_point = edit["origin"] if edit["origin"] else rect.tl + fitz.Point(0, fontsize)
-            
+            # Not checkpointed, so a rerun retries this page
+            logger.warning("Page %d (%s) translation failed, keeping original: %s", page_num + 1, target, e)
+            failed_pages[target].append(page_num)
+            return texts
+        if target in doc_keys:
+            _checkpoints.save(doc_keys[target], page_num, translated)
+        return translated
+
+    def translate_page(item: tuple) -> tuple[int, list[dict], dict[str, list[str]]]:
+        page_num, edits, raster = item
+        page_lang = source_lang
+        if raster is not None:
             try:
-                # Convert int color to RGB tuple
-                c = edit["color"]
-                if isinstance(c, int):
-                    r = ((c >> 16) & 0xFF) / 255.0
-                    g = ((c >> 8) & 0xFF) / 255.0
-                    b = (c & 0xFF) / 255.0
-                    color = (r, g, b)
-                else:
-                    color = (0, 0, 0)
-
-                tw = fitz.TextWriter(page.rect)
-                if font_path:
-                    font = fitz.Font(fontfile=font_path)
-                else:
-                    font = fitz.Font("helv")
-                
-                tw.append(insertion_point, translated, font=font, fontsize=fontsize)
-                tw.write_text(page, color=color)
+                with metrics.timer("pdf.ocr"):
+                    edits, page_lang = _ocr_page_edits(raster[0], raster[1], PDF_OCR_DPI, source_lang)
+                logger.info("Page %d has no text layer; OCR found %d regions", page_num + 1, len(edits))
             except Exception as e:
-                logger.warning("Failed to write text at %s: %s", rect, e)
-                # Fallback: simple insert
-                page.insert_text(insertion_point, translated, fontsize=fontsize)
+                logger.warning("Page %d OCR failed, leaving page unchanged: %s", page_num + 1, e)
+                for target in targets:
+                    failed_pages[target].append(page_num)
+                return page_num, [], {}
+        original_texts = [e["text"] for e in edits]
+        if not original_texts:
+            return page_num, edits, {}
+        if len(targets) == 1:
+            return page_num, edits, {targets[0]: translate_into(page_num, original_texts, page_lang, targets[0])}
+        translated = map_ordered(
+            lambda target: translate_into(page_num, original_texts, page_lang, target), targets
+        )
+        return page_num, edits, dict(zip(targets, translated))
 
-    doc.save(output_path)
-    doc.close()
-    return output_path
+    # A single non-streaming target is rendered in place and saved once;
+    # otherwise every target assembles its own output page by page.
+    in_place = len(targets) == 1 and not streaming
+    flush_every = PDF_STREAM_FLUSH_PAGES if streaming else max(total_pages, 1)
+    writers = {} if in_place else {
+        target: _StreamingWriter(path, flush_every) for target, path in outputs.items()
+    }
+    try:
+        # Pages are translated concurrently; results come back in page order
+        for page_num, edits, translations in imap_ordered(translate_page, extract_pages()):
+            for target in targets:
+                writer = writers.get(target)
+                page = writer.add_page(doc, page_num) if writer else doc[page_num]
+                if edits:
+                    with metrics.timer("pdf.render"):
+                        _render_page(page, edits, translations[target], font_paths[target])
+                if writer:
+                    writer.page_done()
+            metrics.inc("pdf_pages_total", help="PDF pages translated")
+            if progress:
+                progress(page_num + 1, total_pages)
+
+        if in_place:
+            with metrics.timer("pdf.save"):
+                doc.save(outputs[targets[0]])
+        while writers:
+            writers.popitem()[1].close()
+        for target, key in doc_keys.items():
+            if not failed_pages[target]:
+                _checkpoints.clear(key)
+    finally:
+        # Keep whatever pages were finished before a failure
+        for target, writer in writers.items():
+            try:
+                writer.close()
+            except Exception as e:
+                logger.warning("Could not save partial output %s: %s", outputs[target], e)
+        doc.close()
+    failed = {target: len(pages) for target, pages in failed_pages.items() if pages}
+    if strict and failed:
+        raise TranslationIncomplete(failed)
+    return outputs
 
 
 def extract_pdf_text(input_path: str) -> str:
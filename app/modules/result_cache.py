@@ -0,0 +1,118 @@
+"""Content-addressed cache of whole-file translation outputs."""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bump when the image/PDF pipelines change output so stale results are not served
+PIPELINE_VERSION = "1"
+
+PARTIAL_MARKER = ".partial"
+
+
+class ResultCache:
+    """
+    Translated files stored in one folder as <key>.<ext>. A file's mtime is
+    its last use; eviction drops entries older than max_age_seconds, then the
+    least recently used until the folder is under max_bytes.
+    """
+
+    def __init__(self, folder: str, max_bytes: int, max_age_seconds: int):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def make_key(doc_key: str) -> str:
+        """Cache key from a document key (content hash, languages, model, prompt version)."""
+        return hashlib.sha256(f"{doc_key}:{PIPELINE_VERSION}".encode("utf-8")).hexdigest()
+
+    def filename(self, key: str, ext: str) -> str:
+        return f"{key}.{ext}"
+
+    def partial_path(self, key: str, ext: str, writer: str = "") -> str:
+        """
+        Where a pipeline should write its output before it is committed.
+        writer (e.g. a job id) keeps concurrent producers of the same key
+        apart; the last to commit wins.
+        """
+        suffix = f"-{writer}" if writer else ""
+        return os.path.join(self.folder, f"{key}{PARTIAL_MARKER}{suffix}.{ext}")
+
+    def lookup(self, key: str, ext: str) -> str | None:
+        """Return the cached output filename for key, refreshing its last-use time."""
+        path = os.path.join(self.folder, self.filename(key, ext))
+        with self._lock:
+            try:
+                os.utime(path)
+            except OSError:
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+        return self.filename(key, ext)
+
+    def commit(self, key: str, ext: str, writer: str = "") -> str:
+        """Atomically publish a finished partial output; returns its filename."""
+        os.replace(self.partial_path(key, ext, writer), os.path.join(self.folder, self.filename(key, ext)))
+        with self._lock:
+            self._counters["stores"] += 1
+        self.evict()
+        return self.filename(key, ext)
+
+    def discard(self, key: str, ext: str, writer: str = "") -> None:
+        """Remove an uncommitted partial output, if there is one."""
+        self._remove(self.partial_path(key, ext, writer))
+
+    def evict(self) -> int:
+        """Apply the age and size bounds. Returns the number of files removed."""
+        now = time.time()
+        entries = []
+        with self._lock:
+            try:
+                names = os.listdir(self.folder)
+            except OSError:
+                return 0
+            removed = 0
+            for name in names:
+                path = os.path.join(self.folder, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if not os.path.isfile(path):
+                    continue
+                if now - st.st_mtime > self.max_age_seconds:
+                    removed += self._remove(path)
+                elif PARTIAL_MARKER not in name:
+                    # In-progress outputs are left out of the size bound and only aged out
+                    entries.append((st.st_mtime, st.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                removed += self._remove(path)
+                total -= size
+            self._counters["evictions"] += removed
+        if removed:
+            logger.info("Evicted %d cached translation outputs", removed)
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    @staticmethod
+    def _remove(path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
@@ -0,0 +1,55 @@
+"""Bounded, order-preserving concurrent execution for translation work."""
+
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from config import OLLAMA_MAX_PARALLEL
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def imap_ordered(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int = OLLAMA_MAX_PARALLEL,
+) -> Iterator[R]:
+    """
+    Apply fn to items concurrently, yielding results in input order.
+    At most max_workers * 2 items are pulled from the iterable ahead of the
+    consumer, so slow consumers apply backpressure to the producer.
+    Each call runs in a copy of the caller's context, so context variables
+    (such as a request's metrics breakdown) carry over to the workers.
+    fn is called once per item: retrying failed Ollama requests is the job
+    of OllamaClient, not of the scheduler.
+    """
+    if max_workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    window = max_workers * 2
+    pending = deque()
+    it = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="translate") as pool:
+        try:
+            for item in it:
+                pending.append(pool.submit(contextvars.copy_context().run, fn, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+
+def map_ordered(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int = OLLAMA_MAX_PARALLEL,
+) -> list[R]:
+    """Like imap_ordered, but collects all results into a list."""
+    return list(imap_ordered(fn, items, max_workers))
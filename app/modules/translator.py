@@ -2,11 +2,46 @@
 
 import json
 import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
 import requests
-from config import OLLAMA_URL, OLLAMA_MODEL, LANGUAGES
+from config import (
+    OLLAMA_URL, OLLAMA_MODEL, LANGUAGES, OLLAMA_MAX_PARALLEL, OLLAMA_BACKENDS,
+    OLLAMA_KEEP_ALIVE, OLLAMA_STATUS_TTL, OLLAMA_NUM_CTX, OLLAMA_NUM_PREDICT, CHUNK_OUTPUT_RATIO,
+    OLLAMA_SMALL_MODEL, ROUTE_SMALL_MAX_TOKENS,
+    BATCH_MAX_TOKENS, BATCH_MAX_SEGMENTS, BATCH_MAX_ROUNDS,
+    CACHE_ENABLED, CACHE_DB_PATH, CACHE_MEMORY_ENTRIES, CACHE_MAX_ENTRIES, CACHE_MAX_AGE_SECONDS,
+)
+from app.modules.cache import TranslationCache, make_key
+from app.modules.scheduler import map_ordered
+from app.modules.ollama_client import BackendPool
+from app.modules import metrics
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the prompt wording changes so cached translations are not reused
+PROMPT_VERSION = "2"
+
+_cache = TranslationCache(
+    CACHE_DB_PATH if CACHE_ENABLED else None,
+    memory_entries=CACHE_MEMORY_ENTRIES if CACHE_ENABLED else 0,
+    max_entries=CACHE_MAX_ENTRIES,
+    max_age_seconds=CACHE_MAX_AGE_SECONDS,
+)
+
+# Ollama servers with keep-alive connections. The pool routes each request
+# and is the global cap on concurrent requests, shared by every caller.
+_backends = BackendPool(
+    OLLAMA_BACKENDS or [{"url": OLLAMA_URL, "max_concurrency": OLLAMA_MAX_PARALLEL}],
+    model=OLLAMA_MODEL,
+)
+
+# Short-lived cache so UI polling does not hit /api/tags every time
+_status_lock = threading.Lock()
+_status_cache: dict = {"at": 0.0, "value": None}
+
 # Language name lookup for prompts
 LANG_NAMES = {
     "en": "English", "fr": "French", "de": "German",
@@ -15,19 +50,93 @@ LANG_NAMES = {
 }
 
 
-def _ollama_generate(prompt: str, timeout: int = 120) -> str:
-    """Call Ollama generate API and return the response text."""
-    url = f"{OLLAMA_URL}/api/generate"
+class OllamaUnavailable(RuntimeError):
+    """Ollama could not be reached, timed out or answered with an HTTP error."""
+
+
+class TranslationIncomplete(RuntimeError):
+    """
+    Raised by the image and PDF pipelines in strict mode after writing their
+    outputs, when some pages or regions kept their original text. failed maps
+    each affected target language to the number of failed pages (or 1 for an
+    image).
+    """
+
+    def __init__(self, failed: dict[str, int]):
+        self.failed = failed
+        detail = ", ".join(f"{target}: {count}" for target, count in failed.items())
+        super().__init__(f"Translation incomplete, some text kept its original language ({detail})")
+
+
+def _generate_payload(prompt: str, system: str | None = None, stream: bool = False,
+                      fmt: str | None = None, model: str = OLLAMA_MODEL) -> dict:
     payload = {
-        "model": OLLAMA_MODEL,
+        "model": model,
         "prompt": prompt,
-        "stream": False,
-        "options": {"temperature": 0.1, "num_predict": 8192},
+        "stream": stream,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {"temperature": 0.1, "num_ctx": OLLAMA_NUM_CTX, "num_predict": OLLAMA_NUM_PREDICT},
     }
+    if system:
+        payload["system"] = system
+    if fmt:
+        payload["format"] = fmt
+    return payload
+
+
+@contextmanager
+def _llm_call(kind: str, payload: dict, timeout: int | None = None,
+              stream: bool = False) -> Iterator[requests.Response]:
+    """POST a generate request through the backend pool, counting it by kind and outcome."""
+    status = "error"
+    try:
+        with _backends.call("POST", "/api/generate", json=payload, timeout=timeout, stream=stream) as resp:
+            yield resp
+        status = "ok"
+    finally:
+        metrics.inc("llm_requests_total", help="Ollama generate calls",
+                    kind=kind, model=payload["model"], status=status)
+
+
+def _ollama_generate(prompt: str, system: str | None = None, timeout: int | None = None,
+                     fmt: str | None = None, model: str = OLLAMA_MODEL) -> str:
+    """Call Ollama generate API and return the response text."""
+    payload = _generate_payload(prompt, system, fmt=fmt, model=model)
+    try:
+        with _llm_call(fmt or "text", payload, timeout) as resp:
+            data = resp.json()
+        metrics.record_llm(data)
+        return data.get("response", "").strip()
+    except requests.ConnectionError:
+        raise OllamaUnavailable(
+            "Cannot connect to Ollama. Please ensure Ollama is running "
+            "(run 'ollama serve' or start it from Applications)."
+        )
+    except requests.Timeout:
+        raise OllamaUnavailable("Ollama translation timed out. Try with shorter text.")
+    except requests.RequestException as e:
+        raise OllamaUnavailable(f"Ollama API error: {e}")
+    except Exception as e:
+        raise RuntimeError(f"Ollama API error: {e}")
+
+
+def _ollama_generate_stream(prompt: str, system: str | None = None, timeout: int | None = None,
+                            model: str = OLLAMA_MODEL) -> Iterator[str]:
+    """Call Ollama generate API with streaming, yielding response tokens as they arrive."""
+    payload = _generate_payload(prompt, system, stream=True, model=model)
     try:
-        resp = requests.post(url, json=payload, timeout=timeout)
-        resp.raise_for_status()
-        return resp.json().get("response", "").strip()
+        with _llm_call("stream", payload, timeout, stream=True) as resp:
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise RuntimeError(data["error"])
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    metrics.record_llm(data)
+                    break
     except requests.ConnectionError:
         raise RuntimeError(
             "Cannot connect to Ollama. Please ensure Ollama is running "
@@ -35,74 +144,413 @@ def _ollama_generate(prompt: str, timeout: int = 120) -> str:
         )
     except requests.Timeout:
         raise RuntimeError("Ollama translation timed out. Try with shorter text.")
+    except RuntimeError:
+        raise
     except Exception as e:
         raise RuntimeError(f"Ollama API error: {e}")
 
 
+def _system_prompt(source_lang: str, target_lang: str) -> str:
+    """
+    Instructions for plain-text translation. They go in Ollama's system field,
+    ahead of the text, so every chunk of a language pair shares the same
+    prompt prefix and the server can reuse its evaluated KV cache.
+    """
+    src_name = LANG_NAMES.get(source_lang, source_lang)
+    tgt_name = LANG_NAMES.get(target_lang, target_lang)
+
+    if source_lang == "auto":
+        system = (
+            f"Translate the user's text to {tgt_name}. "
+            f"Auto-detect the source language.\n\n"
+        )
+    else:
+        system = f"Translate the user's text from {src_name} to {tgt_name}.\n\n"
+
+    system += (
+        "RULES:\n"
+        "- Return ONLY the translated text, no explanations or notes\n"
+        "- Preserve all numbers, dates, monetary amounts, and formatting exactly\n"
+        "- Preserve financial terminology accurately (e.g. revenue, EBITDA, net income, 營收, 淨利)\n"
+        "- Preserve paragraph breaks and structure\n"
+        "- Do NOT add quotes around the translation"
+    )
+    return system
+
+
+def _route(text: str, source_lang: str) -> str | None:
+    """
+    Pick the model for a piece of text: None if it has no letters to
+    translate (numbers, amounts, punctuation), OLLAMA_SMALL_MODEL for a short
+    single-line label, otherwise OLLAMA_MODEL. Counted in metrics by route.
+    """
+    if not any(ch.isalpha() for ch in text):
+        route, model = "passthrough", None
+    elif (OLLAMA_SMALL_MODEL and "\n" not in text.strip()
+          and _estimate_tokens(text, source_lang) <= ROUTE_SMALL_MAX_TOKENS):
+        route, model = "small", OLLAMA_SMALL_MODEL
+    else:
+        route, model = "main", OLLAMA_MODEL
+    metrics.inc("route_segments_total", help="Texts by model routing decision", route=route)
+    return model
+
+
+def _translate_chunk(chunk: str, source_lang: str, target_lang: str, model: str = OLLAMA_MODEL) -> str:
+    """Translate one chunk, consulting the translation cache first."""
+    if not chunk.strip():
+        return chunk
+
+    key = make_key(chunk, source_lang, target_lang, model, PROMPT_VERSION)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = _ollama_generate(chunk, _system_prompt(source_lang, target_lang), model=model)
+    if not result:
+        return chunk
+    _cache.put(key, result)
+    return result
+
+
+def _translate_text(text: str, source_lang: str, target_lang: str, model: str) -> str:
+    chunks = _chunk_text(text, _chunk_budget(_system_prompt(source_lang, target_lang)), source_lang)
+    translated_chunks = map_ordered(
+        lambda chunk: _translate_chunk(chunk, source_lang, target_lang, model), chunks
+    )
+
+    return "\n".join(translated_chunks) if len(chunks) > 1 else translated_chunks[0]
+
+
 def translate_text(text: str, source_lang: str, target_lang: str) -> str:
     """Translate text from source to target language using Ollama."""
     if not text or not text.strip():
         return text
 
+    model = _route(text, source_lang)
+    if model is None:
+        return text
+    return _translate_text(text, source_lang, target_lang, model)
+
+
+def translate_text_stream(text: str, source_lang: str, target_lang: str) -> Iterator[str]:
+    """
+    Translate text like translate_text, but yield pieces as soon as they are
+    available: tokens while Ollama generates, whole chunks on cache hits.
+    """
+    if not text or not text.strip():
+        if text:
+            yield text
+        return
+
+    model = _route(text, source_lang)
+    if model is None:
+        yield text
+        return
+
+    system = _system_prompt(source_lang, target_lang)
+    chunks = _chunk_text(text, _chunk_budget(system), source_lang)
+    for n, chunk in enumerate(chunks):
+        if n:
+            yield "\n"
+        if not chunk.strip():
+            yield chunk
+            continue
+
+        key = make_key(chunk, source_lang, target_lang, model, PROMPT_VERSION)
+        cached = _cache.get(key)
+        if cached is not None:
+            yield cached
+            continue
+
+        parts = []
+        for token in _ollama_generate_stream(chunk, system, model=model):
+            if not parts:
+                # Match the non-streaming path, which strips leading whitespace
+                token = token.lstrip()
+                if not token:
+                    continue
+            parts.append(token)
+            yield token
+
+        result = "".join(parts).strip()
+        if result:
+            _cache.put(key, result)
+        else:
+            yield chunk
+
+
+# Characters per token for Latin-script text by source language, for a
+# Qwen-style BPE vocabulary. CJK, kana, hangul and digits (numbers are split
+# into single digits) count as one token each.
+_LATIN_CHARS_PER_TOKEN = {"en": 4.0, "fr": 3.5, "de": 3.3}
+_DEFAULT_CHARS_PER_TOKEN = 3.5
+# Chat template tokens around the system prompt and the user's text
+_PROMPT_OVERHEAD_TOKENS = 32
+# Key, quotes, colon and comma around each segment of a JSON batch
+_SEGMENT_OVERHEAD_TOKENS = 4
+
+
+def _token_weights(text: str, lang: str | None = None) -> list[float]:
+    """Estimated tokens contributed by each character of text."""
+    latin = 1.0 / _LATIN_CHARS_PER_TOKEN.get(lang, _DEFAULT_CHARS_PER_TOKEN)
+    weights = []
+    for ch in text:
+        if ord(ch) >= 0x2E80 or ch.isdigit():
+            weights.append(1.0)
+        elif ch.isalpha() or ch.isspace():
+            weights.append(latin)
+        else:
+            weights.append(0.5)  # punctuation and symbols rarely merge into words
+    return weights
+
+
+def _estimate_tokens(text: str, lang: str | None = None) -> int:
+    """Local estimate of how many model tokens text takes."""
+    return int(sum(_token_weights(text, lang))) + 1
+
+
+def _chunk_budget(system: str) -> int:
+    """
+    Most input tokens per call: the system prompt, the input and its
+    translation (CHUNK_OUTPUT_RATIO times the input) must fit OLLAMA_NUM_CTX,
+    and the translation must fit OLLAMA_NUM_PREDICT.
+    """
+    room = OLLAMA_NUM_CTX - _estimate_tokens(system, "en") - _PROMPT_OVERHEAD_TOKENS
+    return max(int(min(room / (1 + CHUNK_OUTPUT_RATIO), OLLAMA_NUM_PREDICT / CHUNK_OUTPUT_RATIO)), 64)
+
+
+def _batch_system_prompt(source_lang: str, target_lang: str) -> str:
+    """Instructions for JSON batch translation; the user prompt is the segments object."""
     src_name = LANG_NAMES.get(source_lang, source_lang)
     tgt_name = LANG_NAMES.get(target_lang, target_lang)
 
-    chunks = _chunk_text(text, max_len=3000)
-    translated_chunks = []
+    if source_lang == "auto":
+        system = (
+            f"Translate each numbered segment of the user's JSON object to {tgt_name}. "
+            f"Auto-detect the source language.\n\n"
+        )
+    else:
+        system = f"Translate each numbered segment of the user's JSON object from {src_name} to {tgt_name}.\n\n"
 
-    for chunk in chunks:
-        if source_lang == "auto":
-            prompt = (
-                f"Translate the following text to {tgt_name}. "
-                f"Auto-detect the source language.\n\n"
-            )
-        else:
-            prompt = f"Translate the following text from {src_name} to {tgt_name}.\n\n"
-
-        prompt += (
-            "RULES:\n"
-            "- Return ONLY the translated text, no explanations or notes\n"
-            "- Preserve all numbers, dates, monetary amounts, and formatting exactly\n"
-            "- Preserve financial terminology accurately (e.g. revenue, EBITDA, net income, 營收, 淨利)\n"
-            "- Preserve paragraph breaks and structure\n"
-            "- Do NOT add quotes around the translation\n\n"
-            f"Text to translate:\n{chunk}"
+    system += (
+        "RULES:\n"
+        "- Reply with a JSON object mapping every segment number to its translation\n"
+        "- Use exactly the same keys as the input, one translation per key, never merge or split segments\n"
+        "- Preserve all numbers, dates, monetary amounts, and formatting exactly\n"
+        "- Preserve financial terminology accurately (e.g. revenue, EBITDA, net income, 營收, 淨利)\n"
+        "- No explanations or notes"
+    )
+    return system
+
+
+def _parse_batch_reply(reply: str, keys: list[str]) -> dict[str, str]:
+    """Return the translations for keys present in a JSON batch reply."""
+    try:
+        data = json.loads(reply)
+    except (json.JSONDecodeError, TypeError):
+        return {}
+    if isinstance(data, dict) and len(data) == 1 and isinstance(next(iter(data.values())), dict):
+        # Tolerate replies wrapped as {"segments": {...}} or {"translations": {...}}
+        data = next(iter(data.values()))
+    if not isinstance(data, dict):
+        return {}
+    found = {}
+    for key in keys:
+        value = data.get(key)
+        if isinstance(value, str) and value.strip():
+            found[key] = value.strip()
+    return found
+
+
+def _pack_batches(texts: list[str], source_lang: str, target_lang: str) -> list[list[int]]:
+    """
+    Group text indices into batches bounded by BATCH_MAX_SEGMENTS and by
+    BATCH_MAX_TOKENS estimated tokens (less if the context window is smaller).
+    """
+    max_tokens = min(BATCH_MAX_TOKENS, _chunk_budget(_batch_system_prompt(source_lang, target_lang)))
+    batches, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = _estimate_tokens(text, source_lang) + _SEGMENT_OVERHEAD_TOKENS
+        if current and (current_tokens + tokens > max_tokens or len(current) >= BATCH_MAX_SEGMENTS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _translate_batch(texts: list[str], source_lang: str, target_lang: str,
+                     model: str = OLLAMA_MODEL) -> dict[int, str]:
+    """
+    Send one JSON batch; return translations only for indices that came back
+    valid. OllamaUnavailable is raised, not swallowed: retrying the segments
+    one by one would only fail again.
+    """
+    segments = {str(n + 1): text for n, text in enumerate(texts)}
+    try:
+        reply = _ollama_generate(
+            json.dumps(segments, ensure_ascii=False), _batch_system_prompt(source_lang, target_lang),
+            fmt="json", model=model,
         )
+    except OllamaUnavailable:
+        raise
+    except Exception as e:
+        logger.warning("Batch of %d segments failed: %s", len(texts), e)
+        return {}
+    found = _parse_batch_reply(reply, list(segments))
+    if len(found) != len(segments):
+        logger.info("Batch reply covered %d of %d segments", len(found), len(segments))
+    return {int(k) - 1: v for k, v in found.items()}
 
-        result = _ollama_generate(prompt)
-        translated_chunks.append(result if result else chunk)
 
-    return "\n".join(translated_chunks) if len(chunks) > 1 else translated_chunks[0]
+def translate_segments(
+    segments: list[str], source_lang: str, target_lang: str, strict: bool = False
+) -> list[str]:
+    """
+    Translate a list of independent segments (PDF spans, OCR regions) in as few
+    LLM calls as possible. Segments without letters are kept as they are and
+    short labels go to the small model (see _route). The rest are
+    deduplicated, served from the cache when possible, and sent as numbered
+    JSON batches, one model per batch; any segment missing from a reply is
+    re-requested on its own from the main model. Output is aligned 1:1 with
+    the input. Segments that still fail keep their original text, or raise
+    RuntimeError if strict is set. If Ollama is unreachable or answers with
+    an HTTP error, the remaining segments fail at once rather than one by one.
+    """
+    results: list[str | None] = [None] * len(segments)
+    pending: dict[str, list[int]] = {}
+    models: dict[str, str] = {}
+    for i, text in enumerate(segments):
+        if not text or not text.strip():
+            results[i] = text
+            continue
+        model = _route(text, source_lang)
+        if model is None:
+            results[i] = text
+            continue
+        key = make_key(text, source_lang, target_lang, model, PROMPT_VERSION)
+        cached = _cache.get(key)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(text, []).append(i)
+            models[text] = model
+
+    todo = list(pending)
+    try:
+        for _ in range(BATCH_MAX_ROUNDS):
+            if not todo:
+                break
+            batches = []
+            for model in dict.fromkeys(models[text] for text in todo):
+                group = [text for text in todo if models[text] == model]
+                batches += [(model, [group[i] for i in batch])
+                            for batch in _pack_batches(group, source_lang, target_lang)]
+            replies = map_ordered(
+                lambda job: _translate_batch(job[1], source_lang, target_lang, job[0]), batches
+            )
+            missing = []
+            for (model, batch), found in zip(batches, replies):
+                for n, text in enumerate(batch):
+                    if n in found:
+                        _cache.put(make_key(text, source_lang, target_lang, model, PROMPT_VERSION), found[n])
+                        for i in pending[text]:
+                            results[i] = found[n]
+                    else:
+                        missing.append(text)
+            todo = missing
+
+        # Anything a received reply left out is translated individually by the
+        # main model
+        def translate_single(text: str) -> str:
+            try:
+                return _translate_text(text, source_lang, target_lang, OLLAMA_MODEL)
+            except OllamaUnavailable:
+                raise
+            except Exception as e:
+                if strict:
+                    raise RuntimeError(f"Segment translation failed: {e}") from e
+                logger.warning("Segment translation failed, keeping original: %s", e)
+                return text
+
+        for text, translated in zip(todo, map_ordered(translate_single, todo)):
+            for i in pending[text]:
+                results[i] = translated
+    except OllamaUnavailable as e:
+        # Ollama is down or erroring: give up on the remaining segments at once
+        if strict:
+            raise RuntimeError(f"Segment translation failed: {e}") from e
+        logger.warning("Segment translation failed, keeping %d originals: %s",
+                       sum(r is None for r in results), e)
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = segments[i]
+
+    return results
+
+
+def document_key(content_hash: str, source_lang: str, target_lang: str) -> str:
+    """Identify a document translation: input hash plus everything that changes the output."""
+    models = f"{OLLAMA_MODEL}+{OLLAMA_SMALL_MODEL}" if OLLAMA_SMALL_MODEL else OLLAMA_MODEL
+    return f"{content_hash}:{source_lang}:{target_lang}:{models}:{PROMPT_VERSION}"
+
+
+def cache_stats() -> dict:
+    """Return translation cache hit/miss counters."""
+    return _cache.stats()
 
 
 def check_ollama_status() -> dict:
-    """Check if Ollama is running and the model is available."""
-    try:
-        resp = requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
-        resp.raise_for_status()
-        models = [m["name"] for m in resp.json().get("models", [])]
-        model_ready = any(OLLAMA_MODEL in m for m in models)
-        return {"running": True, "model_ready": model_ready, "model": OLLAMA_MODEL, "models": models}
-    except Exception:
-        return {"running": False, "model_ready": False, "model": OLLAMA_MODEL}
-
-
-def _chunk_text(text: str, max_len: int = 3000) -> list[str]:
-    """Split text into chunks respecting sentence boundaries where possible."""
-    if len(text) <= max_len:
+    """Check if Ollama is running and the model is available (cached for OLLAMA_STATUS_TTL)."""
+    with _status_lock:
+        if _status_cache["value"] is not None and time.monotonic() - _status_cache["at"] < OLLAMA_STATUS_TTL:
+            return _status_cache["value"]
+        backends = _backends.check_all()
+        reachable = [b for b in backends if b["reachable"]]
+        models = sorted({m for b in reachable for m in b["models"]})
+        status = {
+            "running": bool(reachable),
+            "model_ready": any(OLLAMA_MODEL in m for m in models),
+            "model": OLLAMA_MODEL,
+        }
+        if OLLAMA_SMALL_MODEL:
+            status["small_model"] = OLLAMA_SMALL_MODEL
+            status["small_model_ready"] = any(OLLAMA_SMALL_MODEL in m for m in models)
+        if reachable:
+            status["models"] = models
+        if len(backends) > 1:
+            status["backends"] = backends
+        _status_cache["at"] = time.monotonic()
+        _status_cache["value"] = status
+        return status
+
+
+def _chunk_text(text: str, max_tokens: int, lang: str | None = None) -> list[str]:
+    """Split text into chunks of at most max_tokens estimated tokens, at sentence boundaries where possible."""
+    weights = _token_weights(text, lang)
+    if sum(weights) <= max_tokens:
         return [text]
 
     chunks = []
-    while text:
-        if len(text) <= max_len:
-            chunks.append(text)
+    start, n = 0, len(text)
+    while start < n:
+        # Longest run of characters from start that fits the budget
+        end, total = start, 0.0
+        while end < n and total + weights[end] <= max_tokens:
+            total += weights[end]
+            end += 1
+        if end >= n:
+            chunks.append(text[start:])
             break
-        split_at = max_len
+        end = max(end, start + 1)
+        split_at = end
         for sep in ["\n\n", "\n", ". ", "。", "！", "？"]:
-            idx = text.rfind(sep, 0, max_len)
-            if idx > max_len // 2:
+            idx = text.rfind(sep, start, end)
+            if idx > start + (end - start) // 2:
                 split_at = idx + len(sep)
                 break
-        chunks.append(text[:split_at])
-        text = text[split_at:]
+        chunks.append(text[start:split_at])
+        start = split_at
     return chunks
@@ -0,0 +1,127 @@
+"""
+Execution backend for CPU-heavy image work (OCR, compositing).
+
+With OCR_BACKEND = "thread" everything runs in-process. With "process", OCR
+and compositing run in a pool of worker processes, each owning long-lived
+EasyOCR readers, so concurrent images use separate cores instead of sharing
+one interpreter. Images are passed by file path, or through shared memory
+when they are already decoded arrays (uploads, rasterized PDF pages), so
+pixel data is never pickled; only region lists and translations cross the
+boundary.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+from config import OCR_BACKEND, OCR_PROCESS_WORKERS, OCR_TORCH_THREADS, OCR_PRELOAD_LANGUAGES
+
+logger = logging.getLogger(__name__)
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker(torch_threads: int, preload_langs: list[str]) -> None:
+    """Process initializer: cap torch threads per worker and warm its readers."""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] [worker] %(message)s")
+    try:
+        import torch
+        torch.set_num_threads(max(torch_threads, 1))
+    except ImportError:
+        pass
+    from app.modules.ocr import preload_readers
+    preload_readers(preload_langs)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: torch and its thread pools do not survive fork reliably
+            _pool = ProcessPoolExecutor(
+                max_workers=OCR_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(OCR_TORCH_THREADS, OCR_PRELOAD_LANGUAGES),
+            )
+            logger.info("Started OCR process pool with %d workers", OCR_PROCESS_WORKERS)
+        return _pool
+
+
+def _ocr_task(image, source_lang: str) -> list[dict]:
+    from app.modules.ocr import extract_text_from_image
+    return extract_text_from_image(image, source_lang)
+
+
+def _compose_task(image, regions: list[dict], translations: list[str],
+                  target_lang: str, output_path: str) -> str:
+    from app.modules.image_handler import compose_image
+    return compose_image(image, regions, translations, target_lang, output_path)
+
+
+def _attached(task, spec: tuple, *args):
+    """Worker side: run task on an array that lives in shared memory."""
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    image = None
+    try:
+        image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        return task(image, *args)
+    finally:
+        image = None  # drop the view before closing the mapping
+        shm.close()
+
+
+def _dispatch(task, image, *args):
+    """Run task(image, *args) in-process or in the pool, sharing arrays via shared memory."""
+    if OCR_BACKEND != "process":
+        return task(image, *args)
+    if not isinstance(image, np.ndarray):
+        return _get_pool().submit(task, image, *args).result()
+
+    shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+    try:
+        np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+        spec = (shm.name, image.shape, image.dtype.str)
+        return _get_pool().submit(_attached, task, spec, *args).result()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def run_ocr(image, source_lang: str) -> list[dict]:
+    """Extract text regions from an image (file path or RGB array) on the configured backend."""
+    return _dispatch(_ocr_task, image, source_lang)
+
+
+def run_compose(image, regions: list[dict], translations: list[str],
+                target_lang: str, output_path: str) -> str:
+    """Render translations onto an image (file path or RGB array) on the configured backend."""
+    return _dispatch(_compose_task, image, regions, translations, target_lang, output_path)
+
+
+def _noop() -> None:
+    return None
+
+
+def warm_up() -> None:
+    """Load OCR readers ahead of the first request, in-process or in every worker."""
+    if OCR_BACKEND == "process":
+        pool = _get_pool()
+        for future in [pool.submit(_noop) for _ in range(OCR_PROCESS_WORKERS)]:
+            future.result()
+    else:
+        from app.modules.ocr import preload_readers
+        preload_readers()
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
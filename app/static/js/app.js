@@ -77,13 +77,30 @@ document.addEventListener("DOMContentLoaded", () => {
         $("#status-bar").style.display = "none";
     }
 
+    // ── Job polling ──
+    async function runFileJob(fd, label) {
+        const res = await fetch("/api/translate/file", { method: "POST", body: fd });
+        let job = await res.json();
+        if (job.error && !job.job_id) throw new Error(job.error);
+        while (job.status === "queued" || job.status === "running") {
+            const { done, total } = job.progress;
+            showStatus(total ? `${label} (${done}/${total})…` : `${label} (queued)…`);
+            await new Promise(r => setTimeout(r, 1000));
+            job = await (await fetch(job.status_url)).json();
+        }
+        if (job.status !== "done") throw new Error(job.error || `Job ${job.status}`);
+        return job;
+    }
+
     // ── Text Translation ──
     $("#translate-text-btn").addEventListener("click", async () => {
         const text = $("#source-text").value.trim();
         if (!text) return;
         showStatus("Translating text…");
+        const out = $("#result-text");
+        out.value = "";
         try {
-            const res = await fetch("/api/translate/text", {
+            const res = await fetch("/api/translate/text/stream", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
                 body: JSON.stringify({
@@ -92,9 +109,35 @@ document.addEventListener("DOMContentLoaded", () => {
                     target_lang: $("#target-lang").value,
                 }),
             });
-            const data = await res.json();
-            if (data.error) throw new Error(data.error);
-            $("#result-text").value = data.translated_text;
+            if (!res.ok) {
+                const data = await res.json();
+                throw new Error(data.error || res.statusText);
+            }
+            // Render Server-Sent Events as they arrive
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let sep;
+                while ((sep = buffer.indexOf("\n\n")) !== -1) {
+                    const raw = buffer.slice(0, sep);
+                    buffer = buffer.slice(sep + 2);
+                    let event = "message", payload = "";
+                    for (const line of raw.split("\n")) {
+                        if (line.startsWith("event: ")) event = line.slice(7);
+                        else if (line.startsWith("data: ")) payload += line.slice(6);
+                    }
+                    const data = payload ? JSON.parse(payload) : {};
+                    if (event === "error") throw new Error(data.error);
+                    if (event === "message" && data.text) {
+                        out.value += data.text;
+                        out.scrollTop = out.scrollHeight;
+                    }
+                }
+            }
         } catch (e) {
             alert("Translation failed: " + e.message);
         } finally {
@@ -146,9 +189,7 @@ document.addEventListener("DOMContentLoaded", () => {
         fd.append("source_lang", $("#source-lang").value);
         fd.append("target_lang", $("#target-lang").value);
         try {
-            const res = await fetch("/api/translate/file", { method: "POST", body: fd });
-            const data = await res.json();
-            if (data.error) throw new Error(data.error);
+            const data = await runFileJob(fd, "Translating image");
             $("#image-result-img").src = data.download_url;
             $("#image-download").href = data.download_url;
             $("#image-result").style.display = "block";
@@ -169,9 +210,7 @@ document.addEventListener("DOMContentLoaded", () => {
         fd.append("source_lang", $("#source-lang").value);
         fd.append("target_lang", $("#target-lang").value);
         try {
-            const res = await fetch("/api/translate/file", { method: "POST", body: fd });
-            const data = await res.json();
-            if (data.error) throw new Error(data.error);
+            const data = await runFileJob(fd, "Translating PDF");
             $("#pdf-download").href = data.download_url;
             $("#pdf-result").style.display = "block";
         } catch (e) {
@@ -0,0 +1,95 @@
+"""
+Deterministic benchmark inputs: text, text-layer PDFs and images at several
+sizes and densities. Everything is generated in memory from a seed, so runs
+on different machines translate exactly the same content.
+"""
+
+import io
+import random
+
+EN_WORDS = (
+    "revenue net income operating margin EBITDA quarter fiscal year guidance cash flow "
+    "dividend per share segment growth decline increase compared with prior period total "
+    "assets liabilities equity capital expenditure depreciation amortization tax rate "
+    "the company reported strong demand across all regions and expects continued"
+).split()
+ZH_WORDS = (
+    "營收 淨利 營業利益 毛利率 本季 全年 財測 現金流量 股利 每股盈餘 部門 成長 衰退 "
+    "增加 與去年同期相比 總資產 負債 股東權益 資本支出 折舊 攤銷 稅率 公司 需求 強勁"
+).split()
+TABLE_LABELS = ["Revenue", "Cost of sales", "Gross profit", "Operating expenses", "Net income",
+                "EPS", "Total assets", "Cash", "營收", "淨利", "毛利"]
+
+
+def _sentence(rng: random.Random, lang: str) -> str:
+    words = ZH_WORDS if lang == "zh-TW" else EN_WORDS
+    n = rng.randint(8, 20)
+    picked = [rng.choice(words) for _ in range(n)]
+    if rng.random() < 0.5:
+        picked.insert(rng.randrange(n), f"{rng.randint(1, 9999):,}.{rng.randint(0, 99):02d}")
+    if lang == "zh-TW":
+        return "".join(picked) + "。"
+    return " ".join(picked).capitalize() + "."
+
+
+def text_fixture(chars: int, lang: str = "en", seed: int = 0) -> str:
+    """Paragraphs of financial-sounding text, about chars characters long."""
+    rng = random.Random(seed)
+    paragraphs, size = [], 0
+    while size < chars:
+        paragraph = (" " if lang != "zh-TW" else "").join(_sentence(rng, lang) for _ in range(rng.randint(3, 6)))
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:chars]
+
+
+def pdf_fixture(pages: int, lines_per_page: int = 30, lang: str = "en", table: bool = False,
+                seed: int = 0) -> bytes:
+    """
+    A PDF with a text layer. Prose pages carry lines_per_page sentences; table
+    pages carry lines_per_page rows of short label and number cells, the
+    shape of a financial statement.
+    """
+    import fitz
+
+    rng = random.Random(seed)
+    fontname = "china-t" if lang == "zh-TW" else "helv"
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=595, height=842)
+        line_height = (842 - 100) / max(lines_per_page, 1)
+        size = min(10.0, line_height * 0.7)
+        for row in range(lines_per_page):
+            y = 50 + (row + 1) * line_height
+            if table:
+                page.insert_text((50, y), rng.choice(TABLE_LABELS), fontsize=size, fontname="china-t")
+                for col in range(4):
+                    value = f"{rng.randint(-999, 99999):,}"
+                    page.insert_text((260 + col * 80, y), value, fontsize=size, fontname="helv")
+            else:
+                text = _sentence(rng, lang)[:60 if lang == "zh-TW" else 95]
+                page.insert_text((50, y), text, fontsize=size, fontname=fontname)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def image_fixture(width: int, height: int, lines: int = 10, lang: str = "en", seed: int = 0) -> bytes:
+    """A PNG with lines of dark text on a light background."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    from app.modules.fonts import font_path_for
+
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (245, 245, 240))
+    draw = ImageDraw.Draw(image)
+    line_height = height // (lines + 1)
+    size = max(int(line_height * 0.5), 10)
+    font_path = font_path_for(lang)
+    font = ImageFont.truetype(font_path, size) if font_path else ImageFont.load_default()
+    for row in range(lines):
+        text = _sentence(rng, lang)[:max(width // size, 10)]
+        draw.text((width // 20, (row + 1) * line_height - size // 2), text, fill=(20, 20, 20), font=font)
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
@@ -0,0 +1,245 @@
+"""
+Stub Ollama HTTP server for benchmarks.
+
+Implements the parts of the Ollama API the translator uses (/api/tags and
+/api/generate, streaming or not, plain or format=json) and answers without
+a model: plain prompts get the text to translate back, tagged with the
+target language; JSON batch prompts get an object with exactly the same keys.
+Generation time is simulated from token counts, at most max_parallel requests
+are served at once (the rest queue, like OLLAMA_NUM_PARALLEL), and failures
+can be injected as HTTP 500s or batch replies with a key missing. Like
+Ollama's per-slot KV cache, a system prompt seen recently is not evaluated
+again, so only the user prompt counts toward prompt time.
+
+    python -m benchmarks.mock_ollama --port 11435 --token-latency 0.005
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TARGET_RE = re.compile(r"\bto ([A-Z][A-Za-z ]+?)[.\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+class MockOllama:
+    """
+    In-process stub server. token_latency is seconds per generated token,
+    prompt_latency seconds per prompt token; model_latency overrides
+    token_latency per model (e.g. a faster small model). failure_rate is the
+    chance a request gets a 500 and partial_rate the chance a JSON batch
+    reply drops one key.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token_latency: float = 0.002,
+                 prompt_latency: float = 0.0002, max_parallel: int = 4, failure_rate: float = 0.0,
+                 partial_rate: float = 0.0, models: list[str] | None = None, seed: int = 0,
+                 model_latency: dict[str, float] | None = None):
+        self.token_latency = token_latency
+        self.model_latency = model_latency or {}
+        self.prompt_latency = prompt_latency
+        self.failure_rate = failure_rate
+        self.partial_rate = partial_rate
+        self.models = models or ["qwen2.5:7b"]
+        self._slots = threading.BoundedSemaphore(max_parallel)
+        self._max_prefixes = max_parallel
+        self._prefixes: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._counters: dict = {}
+        self.reset()
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json(200, {"models": [{"name": m} for m in mock.models]})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json(400, {"error": "invalid JSON"})
+                    return
+                if self.path != "/api/generate":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                mock._generate(self, payload)
+
+            def _send_json(self, status: int, body: dict):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters = {
+                "calls": 0, "json_calls": 0, "stream_calls": 0, "failures": 0, "partial_replies": 0,
+                "prompt_tokens": 0, "cached_prompt_tokens": 0, "eval_tokens": 0,
+                "in_flight": 0, "peak_in_flight": 0, "calls_by_model": {},
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, "calls_by_model": dict(self._counters["calls_by_model"])}
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for key, value in deltas.items():
+                self._counters[key] += value
+            self._counters["peak_in_flight"] = max(self._counters["peak_in_flight"], self._counters["in_flight"])
+
+    def _cached_prefix(self, system: str) -> bool:
+        """Whether a slot still holds this system prompt's KV cache; remember it if not."""
+        with self._lock:
+            if system in self._prefixes:
+                self._prefixes.move_to_end(system)
+                return True
+            self._prefixes[system] = None
+            if len(self._prefixes) > self._max_prefixes:
+                self._prefixes.popitem(last=False)
+            return False
+
+    def _roll(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self._random.random() < rate
+
+    def _reply(self, payload: dict) -> str:
+        """What the model "translates" the prompt to."""
+        prompt = payload.get("prompt", "")
+        match = TARGET_RE.search(payload.get("system", "") + "\n" + prompt)
+        tag = f"[{match.group(1)}] " if match else ""
+        if payload.get("format") == "json":
+            try:
+                segments = json.loads(prompt)
+            except ValueError:
+                return "{}"
+            reply = {key: f"{tag}{value}" for key, value in segments.items()}
+            if reply and self._roll(self.partial_rate):
+                reply.pop(self._random.choice(list(reply)))
+                self._count(partial_replies=1)
+            return json.dumps(reply, ensure_ascii=False)
+        return tag + prompt
+
+    def _generate(self, handler: BaseHTTPRequestHandler, payload: dict) -> None:
+        stream = payload.get("stream", True)
+        model = payload.get("model", "")
+        self._count(calls=1, json_calls=int(payload.get("format") == "json"), stream_calls=int(bool(stream)))
+        with self._lock:
+            by_model = self._counters["calls_by_model"]
+            by_model[model] = by_model.get(model, 0) + 1
+        with self._slots:
+            self._count(in_flight=1)
+            try:
+                if self._roll(self.failure_rate):
+                    self._count(failures=1)
+                    handler._send_json(500, {"error": "injected failure"})
+                    return
+
+                system = payload.get("system", "")
+                prompt_tokens = estimate_tokens(payload.get("prompt", ""))
+                if system and self._cached_prefix(system):
+                    self._count(cached_prompt_tokens=estimate_tokens(system))
+                elif system:
+                    prompt_tokens += estimate_tokens(system)
+                reply = self._reply(payload)
+                eval_tokens = estimate_tokens(reply)
+                self._count(prompt_tokens=prompt_tokens, eval_tokens=eval_tokens)
+                prompt_seconds = prompt_tokens * self.prompt_latency
+                eval_seconds = eval_tokens * self.model_latency.get(model, self.token_latency)
+                final = {
+                    "model": payload.get("model", ""),
+                    "done": True,
+                    "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": int(prompt_seconds * 1e9),
+                    "eval_count": eval_tokens,
+                    "eval_duration": int(eval_seconds * 1e9),
+                }
+                time.sleep(prompt_seconds)
+                if not stream:
+                    time.sleep(eval_seconds)
+                    handler._send_json(200, {**final, "response": reply})
+                    return
+
+                handler.send_response(200)
+                handler.send_header("Content-Type", "application/x-ndjson")
+                handler.send_header("Transfer-Encoding", "chunked")
+                handler.end_headers()
+                pieces = [reply[i:i + 16] for i in range(0, len(reply), 16)]
+                for piece in pieces:
+                    time.sleep(eval_seconds / len(pieces))
+                    self._write_chunk(handler, {"response": piece, "done": False})
+                self._write_chunk(handler, {**final, "response": ""})
+                handler.wfile.write(b"0\r\n\r\n")
+            finally:
+                self._count(in_flight=-1)
+
+    @staticmethod
+    def _write_chunk(handler: BaseHTTPRequestHandler, body: dict) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8") + b"\n"
+        handler.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        handler.wfile.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub Ollama server for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-latency", type=float, default=0.002, help="seconds per generated token")
+    parser.add_argument("--prompt-latency", type=float, default=0.0002, help="seconds per prompt token")
+    parser.add_argument("--max-parallel", type=int, default=4, help="requests served at once")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--partial-rate", type=float, default=0.0, help="fraction of JSON replies missing a key")
+    args = parser.parse_args()
+
+    mock = MockOllama(args.host, args.port, args.token_latency, args.prompt_latency,
+                      args.max_parallel, args.failure_rate, args.partial_rate).start()
+    print(f"Mock Ollama listening on {mock.url}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
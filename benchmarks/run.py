@@ -0,0 +1,293 @@
+"""
+Benchmark the text, PDF and image pipelines against a stub Ollama server.
+
+    python -m benchmarks.run --quick                  # small inputs, one pass each
+    python -m benchmarks.run --save main              # write benchmarks/baselines/main.json
+    python -m benchmarks.run --compare main           # fail if anything regressed
+    python -m benchmarks.run --failure-rate 0.05 --partial-rate 0.1 --scenarios pdf
+    python -m benchmarks.run --small-model qwen2.5:1.5b --scenarios pdf-table
+
+The stub (benchmarks/mock_ollama.py) simulates generation time per token, so
+results measure the app's own overhead and how well it batches and overlaps
+LLM calls, independent of any real model. The translation cache and PDF
+checkpoints are disabled so every iteration does the full work. Image
+scenarios run real EasyOCR and are skipped if it is not installed.
+
+Each scenario reports throughput, per-iteration latency (p50/p99), LLM calls
+and tokens per iteration, and the process's peak RSS.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib.util
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from benchmarks import fixtures
+from benchmarks.mock_ollama import MockOllama
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# Metric -> True if higher is better; used when comparing against a baseline
+COMPARED_METRICS = {
+    "throughput": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "llm_calls": False,
+    "peak_rss_mb": False,
+}
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+class _RssSampler:
+    """Tracks peak RSS while a scenario runs."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+
+    def _sample(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "_RssSampler":
+        self.peak = _rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_mb())
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def _scenarios(quick: bool, workdir: str) -> list[dict]:
+    """
+    name, group, units per iteration, unit label, fixture builder, runner and
+    the optional modules the scenario requires.
+    """
+
+    def text(chars: int, lang: str, target: str):
+        def run(data):
+            from app.modules.translator import translate_text
+            translate_text(data, lang, target)
+        return {"build": lambda: fixtures.text_fixture(chars, lang), "run": run, "units": chars, "unit": "chars"}
+
+    def pdf(pages: int, lines: int, table: bool = False):
+        def run(data):
+            from app.modules.pdf_handler import translate_pdf
+            with tempfile.NamedTemporaryFile(suffix=".pdf", dir=workdir) as out:
+                translate_pdf(data, "en", "ja", out.name, resume=False)
+        return {"build": lambda: fixtures.pdf_fixture(pages, lines, table=table), "run": run,
+                "units": pages, "unit": "pages"}
+
+    def image(width: int, height: int, lines: int):
+        def run(data):
+            from app.modules.image_handler import translate_image
+            with tempfile.NamedTemporaryFile(suffix=".png", dir=workdir) as out:
+                translate_image(data, "en", "ja", out.name)
+        return {"build": lambda: fixtures.image_fixture(width, height, lines), "run": run,
+                "units": 1, "unit": "images", "requires": ["easyocr"]}
+
+    scenarios = {
+        "text-en-short": ("text", text(500, "en", "ja")),
+        "text-en-long": ("text", text(5_000 if quick else 20_000, "en", "ja")),
+        "text-zh-long": ("text", text(2_000 if quick else 8_000, "zh-TW", "en")),
+        "pdf-prose": ("pdf", pdf(5 if quick else 20, 30)),
+        "pdf-table": ("pdf", pdf(5 if quick else 20, 40, table=True)),
+        "image-small": ("image", image(1200, 800, 12)),
+    }
+    if not quick:
+        scenarios["pdf-prose-streaming"] = ("pdf", pdf(config.PDF_STREAM_MIN_PAGES * 2, 30))
+        scenarios["image-large-tiled"] = ("image", image(4500, 3000, 40))
+    return [{"name": name, "group": group, **spec} for name, (group, spec) in scenarios.items()]
+
+
+def run_scenario(spec: dict, mock: MockOllama, repeat: int, clients: int, warmup: int) -> dict:
+    data = spec["build"]()
+    for _ in range(warmup):
+        spec["run"](data)
+    mock.reset()
+
+    latencies: list[float] = []
+
+    def timed(_):
+        started = time.perf_counter()
+        spec["run"](data)
+        latencies.append(time.perf_counter() - started)
+
+    with _RssSampler() as rss:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(clients, 1)) as pool:
+            list(pool.map(timed, range(repeat)))
+        wall = time.perf_counter() - started
+
+    llm = mock.stats()
+    return {
+        "name": spec["name"],
+        "iterations": repeat,
+        "clients": clients,
+        "unit": spec["unit"],
+        "units_per_iteration": spec["units"],
+        "wall_seconds": round(wall, 3),
+        "throughput": round(spec["units"] * repeat / wall, 3),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+        "llm_calls": round(llm["calls"] / repeat, 2),
+        "llm_calls_by_model": {m: round(n / repeat, 2) for m, n in llm["calls_by_model"].items()},
+        "prompt_tokens": round(llm["prompt_tokens"] / repeat),
+        "cached_prompt_tokens": round(llm["cached_prompt_tokens"] / repeat),
+        "eval_tokens": round(llm["eval_tokens"] / repeat),
+        "injected_failures": llm["failures"],
+        "peak_llm_concurrency": llm["peak_in_flight"],
+        "peak_rss_mb": round(rss.peak, 1),
+    }
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    """Human-readable regressions against a baseline, beyond tolerance (a fraction)."""
+    previous = {r["name"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        old = previous.get(result["name"])
+        if not old:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = old.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{result['name']}: {metric} {before} -> {after} ({change:+.0%})")
+    return regressions
+
+
+def _print_table(results: list[dict]) -> None:
+    header = f"{'scenario':<22}{'throughput':>18}{'p50 ms':>10}{'p99 ms':>10}{'LLM calls':>11}{'peak RSS':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        if r.get("skipped"):
+            print(f"{r['name']:<22}  skipped: {r['skipped']}")
+            continue
+        rate = f"{r['throughput']:.1f} {r['unit']}/s"
+        print(f"{r['name']:<22}{rate:>18}{r['p50_ms']:>10.0f}{r['p99_ms']:>10.0f}"
+              f"{r['llm_calls']:>11}{r['peak_rss_mb']:>9.0f}M")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the translation pipelines against a stub Ollama.")
+    parser.add_argument("--quick", action="store_true", help="small inputs for a fast smoke run")
+    parser.add_argument("--scenarios", default="", help="comma-separated scenario names or groups (text, pdf, image)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed iterations per scenario")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed iterations before each scenario")
+    parser.add_argument("--clients", type=int, default=1, help="iterations run concurrently")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="stub seconds per generated token")
+    parser.add_argument("--prompt-latency", type=float, default=0.0002, help="stub seconds per prompt token")
+    parser.add_argument("--max-parallel", type=int, default=config.OLLAMA_MAX_PARALLEL,
+                        help="requests the stub serves at once")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of stub requests failing with 500")
+    parser.add_argument("--partial-rate", type=float, default=0.0, help="fraction of JSON replies missing a key")
+    parser.add_argument("--small-model", default=config.OLLAMA_SMALL_MODEL,
+                        help="route short labels to this model (sets OLLAMA_SMALL_MODEL)")
+    parser.add_argument("--small-token-latency", type=float, default=0.0005,
+                        help="stub seconds per token generated by the small model")
+    parser.add_argument("--output", help="write the full JSON report here")
+    parser.add_argument("--save", metavar="NAME", help="save results as baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare with baselines/NAME.json; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed regression before failing (fraction)")
+    args = parser.parse_args(argv)
+
+    models = [config.OLLAMA_MODEL] + ([args.small_model] if args.small_model else [])
+    mock = MockOllama(
+        token_latency=args.token_latency, prompt_latency=args.prompt_latency, max_parallel=args.max_parallel,
+        failure_rate=args.failure_rate, partial_rate=args.partial_rate, models=models,
+        model_latency={args.small_model: args.small_token_latency} if args.small_model else None,
+    ).start()
+    workdir = tempfile.mkdtemp(prefix="translator-bench-")
+
+    # Point the app at the stub and turn off everything that would skip work
+    # on repeated iterations. Must happen before any app module is imported.
+    config.OLLAMA_URL = mock.url
+    config.OLLAMA_BACKENDS = []
+    config.OLLAMA_SMALL_MODEL = args.small_model
+    config.CACHE_ENABLED = False
+    config.CHECKPOINT_DB_PATH = os.path.join(workdir, "checkpoints.db")
+
+    wanted = {s.strip() for s in args.scenarios.split(",") if s.strip()}
+    results = []
+    try:
+        for spec in _scenarios(args.quick, workdir):
+            if wanted and spec["name"] not in wanted and spec["group"] not in wanted:
+                continue
+            # The pipelines wrap import errors (e.g. OCR failed: ...), so check up front
+            missing = [m for m in spec.get("requires", []) if importlib.util.find_spec(m) is None]
+            if missing:
+                results.append({"name": spec["name"], "skipped": f"missing dependency ({', '.join(missing)})"})
+                continue
+            try:
+                result = run_scenario(spec, mock, args.repeat, args.clients, args.warmup)
+            except ImportError as e:
+                result = {"name": spec["name"], "skipped": f"missing dependency ({e.name})"}
+            results.append(result)
+    finally:
+        mock.stop()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "save", "compare")},
+        "results": results,
+    }
+    _print_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline {path}")
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json"), encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings", {}).get("quick") != args.quick:
+            print("Warning: baseline was recorded with a different --quick setting")
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Scaling check for the Ollama backend pool: one workload against 1..N stub servers.
+
+    python -m benchmarks.scaling --nodes 4 --requests 200
+    python -m benchmarks.scaling --nodes 3 --failing 1    # one node answers 500s; requests fail over
+
+Each stub serves --slots requests at once and the pool gets one backend per
+stub with max_concurrency = --slots. Client threads are sized to fill every
+slot, so with generation time dominating, throughput should grow almost
+linearly with the number of nodes. Failing nodes are ejected after
+OLLAMA_EJECT_AFTER errors and their requests are retried elsewhere; the run
+reports any request that still failed.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from benchmarks import fixtures
+from benchmarks.mock_ollama import MockOllama
+
+
+def run_step(nodes: int, failing: int, args) -> dict:
+    from app.modules.ollama_client import BackendPool
+
+    mocks = [
+        MockOllama(token_latency=args.token_latency, max_parallel=args.slots, models=[config.OLLAMA_MODEL],
+                   failure_rate=1.0 if i < failing else 0.0, seed=i).start()
+        for i in range(nodes)
+    ]
+    pool = BackendPool(
+        [{"url": m.url, "max_concurrency": args.slots} for m in mocks],
+        model=config.OLLAMA_MODEL, health_interval=args.health_interval,
+    )
+    payloads = [
+        {
+            "model": config.OLLAMA_MODEL,
+            "system": "Translate the user's text from English to Japanese.",
+            "prompt": fixtures.text_fixture(args.chars, "en", seed=i),
+            "stream": False,
+        }
+        for i in range(args.requests)
+    ]
+
+    def send(payload: dict) -> bool:
+        try:
+            with pool.call("POST", "/api/generate", json=payload) as resp:
+                resp.json()
+            return True
+        except Exception:
+            return False
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=nodes * args.slots) as clients:
+            outcomes = list(clients.map(send, payloads))
+        wall = time.perf_counter() - started
+        backends = pool.stats()
+    finally:
+        pool.close()
+        for mock in mocks:
+            mock.stop()
+
+    return {
+        "nodes": nodes,
+        "failing_nodes": failing,
+        "requests": args.requests,
+        "failed_requests": outcomes.count(False),
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(args.requests / wall, 2),
+        "backends": [
+            {"requests": b["requests"], "errors": b["errors"], "healthy": b["healthy"]} for b in backends
+        ],
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure Ollama backend pool scaling against stub servers.")
+    parser.add_argument("--nodes", type=int, default=4, help="largest number of stub servers")
+    parser.add_argument("--slots", type=int, default=2, help="concurrent requests per stub server")
+    parser.add_argument("--requests", type=int, default=120, help="requests per step")
+    parser.add_argument("--chars", type=int, default=400, help="characters of text per request")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="stub seconds per generated token")
+    parser.add_argument("--failing", type=int, default=0, help="nodes that answer every request with 500")
+    parser.add_argument("--health-interval", type=float, default=1.0, help="seconds between health checks")
+    parser.add_argument("--output", help="write the JSON results here")
+    args = parser.parse_args(argv)
+
+    steps = []
+    for nodes in range(1, args.nodes + 1):
+        failing = min(args.failing, nodes - 1)
+        steps.append(run_step(nodes, failing, args))
+
+    base = steps[0]["requests_per_second"]
+    print(f"{'nodes':>5}{'failing':>9}{'req/s':>10}{'speedup':>9}{'efficiency':>12}{'failed':>8}")
+    for step in steps:
+        healthy_nodes = step["nodes"] - step["failing_nodes"]
+        speedup = step["requests_per_second"] / base
+        step["speedup"] = round(speedup, 2)
+        step["efficiency"] = round(speedup / healthy_nodes, 2)
+        print(f"{step['nodes']:>5}{step['failing_nodes']:>9}{step['requests_per_second']:>10.1f}"
+              f"{speedup:>8.2f}x{step['efficiency']:>11.0%}{step['failed_requests']:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "steps": steps}, f, indent=2)
+    return 1 if any(step["failed_requests"] for step in steps) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
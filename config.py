@@ -19,6 +19,58 @@ LANGUAGES = {
 # Ollama configuration
 OLLAMA_URL = "http://localhost:11434"
 OLLAMA_MODEL = "qwen2.5:7b"
+OLLAMA_KEEP_ALIVE = "30m"       # keep the model loaded between requests
+OLLAMA_CONNECT_TIMEOUT = 5       # seconds
+OLLAMA_READ_TIMEOUT = 120        # seconds, per generate call
+OLLAMA_HTTP_RETRIES = 3          # retries on connection reset / 5xx
+OLLAMA_HTTP_BACKOFF = 0.5        # seconds, jittered and doubled per retry
+OLLAMA_STATUS_TTL = 10           # seconds to cache /api/ollama-status results
+# Sent with every request; keep constant, since a different num_ctx makes Ollama reload the model
+OLLAMA_NUM_CTX = 8192            # context window, in tokens
+OLLAMA_NUM_PREDICT = 4096        # max tokens generated per call
+# Text is chunked by estimated model tokens so each call's input plus its
+# translation fits OLLAMA_NUM_CTX and the translation fits OLLAMA_NUM_PREDICT
+CHUNK_OUTPUT_RATIO = 1.5         # output tokens budgeted per input token
+
+# Size-tiered model routing. Text without letters (numbers, amounts,
+# punctuation) is kept as-is without a model call; short single-line labels
+# go to OLLAMA_SMALL_MODEL; everything else goes to OLLAMA_MODEL.
+# "" sends short labels to OLLAMA_MODEL too. Example: "qwen2.5:1.5b"
+OLLAMA_SMALL_MODEL = ""
+ROUTE_SMALL_MAX_TOKENS = 12      # estimated tokens up to which text counts as a short label
+
+# Concurrency: max Ollama requests in flight (match OLLAMA_NUM_PARALLEL on the server)
+OLLAMA_MAX_PARALLEL = 4
+
+# Several Ollama servers: requests go to the healthy backend with the fewest
+# outstanding requests relative to its weight, up to max_concurrency each.
+# Empty means OLLAMA_URL alone, with OLLAMA_MAX_PARALLEL slots. Example:
+#   OLLAMA_BACKENDS = [
+#       {"url": "http://gpu1:11434", "weight": 2, "max_concurrency": 8},
+#       {"url": "http://gpu2:11434", "weight": 1, "max_concurrency": 4},
+#   ]
+OLLAMA_BACKENDS: list[dict] = []
+OLLAMA_HEALTH_INTERVAL = 10      # seconds between health checks of each backend
+OLLAMA_EJECT_AFTER = 3           # consecutive failures before a backend leaves the rotation
+
+# Structured batch translation (PDF spans, OCR regions)
+BATCH_MAX_TOKENS = 1500    # estimated source tokens per batch request
+BATCH_MAX_SEGMENTS = 60    # segments per batch request
+BATCH_MAX_ROUNDS = 2       # re-requests for segments missing from a batch reply
+
+# Page-streaming PDF pipeline for large documents
+PDF_STREAM_MIN_PAGES = 50     # stream output from this page count up
+PDF_STREAM_FLUSH_PAGES = 20   # pages per incremental save
+CHECKPOINT_DB_PATH = "cache/checkpoints.db"  # per-page progress for resumable PDFs
+PDF_OCR_ENABLED = True        # OCR image-only (scanned) pages
+PDF_OCR_DPI = 200             # rasterization resolution for scanned pages
+
+# Translation memory cache (repeated headers, labels, disclaimers)
+CACHE_ENABLED = True
+CACHE_DB_PATH = "cache/translations.db"
+CACHE_MEMORY_ENTRIES = 4096          # in-process LRU tier
+CACHE_MAX_ENTRIES = 200_000          # on-disk SQLite tier
+CACHE_MAX_AGE_SECONDS = 90 * 24 * 3600
 
 # CJK font fallback for PDF/image overlay (bundled or system)
 # Update these paths for your OS if needed
@@ -41,9 +93,41 @@ LATIN_FONT_PATHS = [
     "C:/Windows/Fonts/arial.ttf",
 ]
 
+# OCR reader management
+OCR_MAX_READERS = 3                  # resident EasyOCR readers besides the auto-detect probes (LRU-evicted)
+OCR_PRELOAD_LANGUAGES = ["auto"]     # source languages whose readers load at startup
+# Auto-detect: probe a few text boxes to pick the smallest matching reader
+OCR_SCRIPT_SAMPLES = 8               # largest boxes recognized by the script probe
+OCR_SCRIPT_MIN_CONFIDENCE = 0.4      # mean probe confidence to accept a script
+OCR_AUTO_HAN_LANG = "zh-TW"          # Han-only text is read as this language
+# Large scans: detect on a downscaled copy, recognize in native-resolution tiles
+OCR_TILE_THRESHOLD = 3000            # longest side (px) above which tiling kicks in
+OCR_DETECT_MAX_SIDE = 2000           # longest side of the detection copy
+OCR_TILE_SIZE = 2048                 # recognition tile size (px)
+OCR_TILE_OVERLAP = 32                # context margin around each tile's boxes (px)
+# "thread": OCR and image compositing run in the server process.
+# "process": they run in a pool of worker processes (one set of readers each),
+# which scales with cores on CPU-only hosts at the cost of per-worker model memory.
+OCR_BACKEND = "thread"
+OCR_PROCESS_WORKERS = 4
+OCR_TORCH_THREADS = 2                # torch threads per worker process
+
 # App settings
 UPLOAD_FOLDER = "uploads"
 OUTPUT_FOLDER = "outputs"
 MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50 MB
+
+# Translated file outputs, cached by content hash (replaces the one-hour sweep)
+RESULT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024   # 2 GB
+RESULT_CACHE_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+# Background translation jobs for uploaded files
+JOB_DB_PATH = "cache/jobs.db"
+JOB_WORKERS = 2
+
+# Command-line batch translation (python -m app.batch). Files are processed
+# BATCH_WORKERS at a time; Ollama requests stay capped by OLLAMA_MAX_PARALLEL.
+BATCH_WORKERS = 4
+BATCH_MANIFEST_NAME = "manifest.json"
 ALLOWED_IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
 ALLOWED_PDF_EXTENSIONS = {"pdf"}